@@ -0,0 +1,143 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import time
+
+from common import enter_work_folder, get_peak_rss
+from fake_server import serve
+
+
+SOURCES = ["WeebCentral", "Mangaonline", "Mangasee123"]
+# Mangasee is disabled in its service, it only runs when picked with --source
+DEFAULT_SOURCES = ["WeebCentral", "Mangaonline"]
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_server(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise Exception(f"Fake server did not start on port {port}.")
+
+
+def get_output_size(folder: str) -> tuple[int, int]:
+    pages = 0
+    size = 0
+    for folder_name, _, files in os.walk(folder):
+        for file_name in files:
+            if file_name.startswith(".") or file_name.endswith((".part", ".cbr")):
+                continue
+            pages += 1
+            size += os.path.getsize(os.path.join(folder_name, file_name))
+    return pages, size
+
+
+def run_source(source: str, base_url: str, args) -> dict:
+    from src.services.utils import get_service
+
+    service = get_service(source)
+    service.HOST = base_url
+    # The same fake server under another name, the real mirrors are never reached
+    service.MIRRORS = [base_url.replace("127.0.0.1", "localhost").split("://", 1)[1]]
+    manga_name = "benchmark"
+
+    try:
+        started_at = time.perf_counter()
+        service.search_chapters(manga_name)
+        searched_at = time.perf_counter()
+        result = service.get_files({
+            "output": os.path.join(os.getcwd(), source),
+            "directory_option": 1,
+            "download_option": "Range",
+            "start_at": 1,
+            "end_at": args.chapters,
+            "cbr": args.cbr,
+        })
+        finished_at = time.perf_counter()
+    except Exception as e:
+        return {"source": source, "status": "error", "error": str(e).splitlines()[0]}
+
+    pages, size = get_output_size(result["output"])
+    elapsed = finished_at - searched_at
+
+    return {
+        "source": source,
+        "status": "ok",
+        "search_seconds": round(searched_at - started_at, 3),
+        "download_seconds": round(elapsed, 3),
+        "pages": pages,
+        "megabytes": round(size / (1024 * 1024), 2),
+        "pages_per_second": round(pages / elapsed, 1),
+        "megabytes_per_second": round(size / (1024 * 1024) / elapsed, 2),
+    }
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="End-to-end download benchmark against a local fake source.")
+    parser.add_argument("--source", choices=SOURCES, action="append", help="repeat to pick several")
+    parser.add_argument("--chapters", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=20, help="pages per chapter")
+    parser.add_argument("--page-size", type=int, default=200 * 1024, help="bytes per page")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes/s per response, 0 is unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses replaced by a 503")
+    parser.add_argument("--cbr", action="store_true", help="compress each chapter to .cbr")
+    parser.add_argument("--keep", action="store_true", help="keep the downloaded files")
+    parser.add_argument("--memory-budget", type=int, metavar="MB", help="response bytes held in memory at once")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = get_parser().parse_args(argv)
+
+    port = get_free_port()
+    server = multiprocessing.Process(target=serve, args=(port, {
+        "chapters": args.chapters,
+        "pages": args.pages,
+        "page_size": args.page_size,
+        "latency": args.latency,
+        "bandwidth": args.bandwidth,
+        "error_rate": args.error_rate,
+    }), daemon=True)
+    server.start()
+
+    work_folder = enter_work_folder()
+
+    from src.services.http_client import HttpClient
+    if args.memory_budget:
+        HttpClient.MEMORY_BUDGET = args.memory_budget * 1024 * 1024
+
+    try:
+        wait_server(port)
+        results = [run_source(source, f"http://127.0.0.1:{port}", args) for source in args.source or DEFAULT_SOURCES]
+    finally:
+        server.terminate()
+        if not args.keep:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    for result in results:
+        print(json.dumps(result), flush=True)
+
+    # The fake server runs in its own process, the peak is the client's alone
+    print(json.dumps({
+        "peak_rss_megabytes": round((get_peak_rss() or 0) / (1024 * 1024), 1),
+        "peak_inflight_megabytes": round(HttpClient.get_client().budget.peak / (1024 * 1024), 2),
+    }))
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import tracemalloc
+
+from common import enter_work_folder
+from fake_server import get_mangaonline_list, get_mangasee_page, get_weebcentral_list
+
+
+BASE_URL = "https://example.com"
+SIZES = [100, 1000, 10000, 50000]
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parsers_baseline.json")
+# A run fails when a case is this many times slower than its baseline
+THRESHOLD = 2.0
+
+
+def get_cases() -> dict:
+    from src.services import mangaonline_service, mangasee_service, wcentral_service
+
+    # Source: (fixture, parser, service class)
+    return {
+        "WeebCentral": (
+            lambda size: get_weebcentral_list(BASE_URL, size),
+            wcentral_service.parse_chapter_list,
+            wcentral_service.WeebCentralService,
+        ),
+        "Mangaonline": (
+            lambda size: get_mangaonline_list(BASE_URL, "benchmark", size),
+            mangaonline_service.parse_chapter_list,
+            mangaonline_service.MangaOnlineService,
+        ),
+        "Mangasee123": (
+            lambda size: get_mangasee_page(BASE_URL, size, 20),
+            mangasee_service.parse_chapter_list,
+            mangasee_service.MangaseeService,
+        ),
+    }
+
+
+def get_manga_dict() -> dict:
+    return {"name": "benchmark", "chapters_count": 0, "directories": {}, "directory_prefix": ""}
+
+
+def measure(func, repeat: int) -> float:
+    # Best of `repeat`, the other runs are mostly noise from the machine
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_case(source: str, fixture, parser, service, size: int, repeat: int) -> dict:
+    content = fixture(size)
+    chapters = parser(content)
+    if len(chapters) != size:
+        raise Exception(f"{source} parsed {len(chapters)} of {size} chapters.")
+
+    parse_time = measure(lambda: parser(content), repeat)
+    build_time = measure(lambda: service._add_chapters(get_manga_dict(), chapters), repeat)
+
+    tracemalloc.start()
+    service._add_chapters(get_manga_dict(), parser(content))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "source": source,
+        "chapters": size,
+        "content_kilobytes": round(len(content) / 1024, 1),
+        "parse_us_per_chapter": round(parse_time / size * 1e6, 3),
+        "build_us_per_chapter": round(build_time / size * 1e6, 3),
+        "peak_kilobytes": round(peak / 1024, 1),
+    }
+
+
+def check(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for result in results:
+        key = f"{result['source']}/{result['chapters']}"
+        if key not in baseline:
+            continue
+
+        for stage in ("parse_us_per_chapter", "build_us_per_chapter"):
+            limit = baseline[key][stage] * threshold
+            if result[stage] > limit:
+                regressions.append(f"{key} {stage} {result[stage]} > {round(limit, 3)}")
+    return regressions
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Chapter list parser micro-benchmarks on generated listings.")
+    parser.add_argument("--source", choices=["WeebCentral", "Mangaonline", "Mangasee123"], action="append")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="chapters per listing")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown over the baseline")
+    parser.add_argument("--check", action="store_true", help="exit with 1 when a case regressed")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store this run as the baseline, run it on the machine that gates"
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = get_parser().parse_args(argv)
+    work_folder = enter_work_folder()
+
+    # _add_chapters only touches the dict it is given, the service is not searched
+    cases = get_cases()
+    results = []
+    try:
+        for source in args.source or cases:
+            fixture, parser, service_class = cases[source]
+            service = service_class()
+            for size in args.sizes:
+                result = run_case(source, fixture, parser, service, size, args.repeat)
+                results.append(result)
+                print(json.dumps(result), flush=True)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    if args.save_baseline:
+        baseline = {f"{result['source']}/{result['chapters']}": result for result in results}
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2)
+        return 0
+
+    if args.check:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = check(results, json.load(file), args.threshold)
+
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
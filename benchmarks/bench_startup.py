@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from common import ROOT
+
+
+# Modules the GUI must not load before the first search or download
+HEAVY_MODULES = [
+    "aiohttp",
+    "src.services.http_client",
+    "src.services.wcentral_service",
+    "src.services.mangaonline_service",
+    "src.services.mangasee_service",
+]
+
+# Runs in a fresh interpreter, a warm sys.modules would hide the import cost
+PROBE = """
+import json, os, shutil, sys, tempfile, time
+started_at = time.perf_counter()
+work_folder = tempfile.mkdtemp(prefix="getmymanga-bench-")
+os.chdir(work_folder)
+sys.path.insert(0, {root!r})
+
+from src.database.connection import Connection
+from src.database.schema import create_tables
+Connection.get_db().connect()
+create_tables()
+database_at = time.perf_counter()
+
+import src.app
+imported_at = time.perf_counter()
+
+window_at = None
+if {window!r}:
+    # The database is already open, the icons are loaded from the repository
+    os.chdir({root!r})
+    app = src.app.App()
+    app.update()
+    window_at = time.perf_counter()
+    app.destroy()
+
+print(json.dumps({{
+    "database_ms": (database_at - started_at) * 1000,
+    "import_ms": (imported_at - database_at) * 1000,
+    "window_ms": (window_at - started_at) * 1000 if window_at else None,
+    "heavy_modules": [name for name in {heavy!r} if name in sys.modules],
+}}))
+shutil.rmtree(work_folder, ignore_errors=True)
+"""
+
+
+def run_probe(window: bool) -> dict:
+    code = PROBE.format(root=ROOT, window=window, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    if output.returncode != 0:
+        raise Exception(f"Startup probe failed:\n{output.stderr.strip().splitlines()[-1]}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="GUI startup time, measured in fresh interpreters.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--window", action="store_true", help="also build the window, needs a display")
+    parser.add_argument("--max-ms", type=float, help="exit with 1 when the median startup is slower")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = get_parser().parse_args(argv)
+    probes = [run_probe(args.window) for _ in range(args.runs)]
+
+    result = {
+        "runs": args.runs,
+        "database_ms": round(statistics.median(probe["database_ms"] for probe in probes), 1),
+        "import_ms": round(statistics.median(probe["import_ms"] for probe in probes), 1),
+        "heavy_modules": probes[-1]["heavy_modules"],
+    }
+    startup = result["database_ms"] + result["import_ms"]
+    if args.window:
+        result["window_ms"] = round(statistics.median(probe["window_ms"] for probe in probes), 1)
+        startup = result["window_ms"]
+
+    print(json.dumps(result))
+
+    if args.max_ms is not None and startup > args.max_ms:
+        print(f"Startup took {startup}ms, the limit is {args.max_ms}ms.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
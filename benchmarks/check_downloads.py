@@ -0,0 +1,386 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+import zipfile
+
+from aiohttp import web
+
+from bench_download import get_free_port
+from common import enter_work_folder
+from fake_server import FakeSource
+
+
+# Failure scenarios of the download pipeline against the fake server, a check
+# fails when it raises, AssertionError tells what went differently
+CHECKS = {}
+
+
+def check(func):
+    CHECKS[func.__name__] = func
+    return func
+
+
+class Server():
+    # The fake server on its own loop in this process, the checks change it between downloads
+
+    def __init__(self, **options) -> None:
+        self.port = get_free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.source = FakeSource(self.base_url, **options)
+        self._loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(self.source.get_app(), access_log=None)
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        self._run(self._start())
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _start(self) -> None:
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+
+    def get_paths(self) -> list[str]:
+        return [path for path, _ in self.source.log]
+
+    def close(self) -> None:
+        self._run(self._runner.cleanup())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def get_service(source: str, server: Server):
+    from src.services.utils import get_service as get_source_service
+
+    service = get_source_service(source)
+    service.HOST = server.base_url
+    service.MIRRORS = []
+    return service
+
+
+def download(service, manga_name: str, start_at: int, end_at: int, cbr: bool = False) -> dict:
+    service.search_chapters(manga_name)
+    return service.get_files({
+        "output": os.path.join(os.getcwd(), manga_name),
+        "directory_option": 1,
+        "download_option": "Range",
+        "start_at": start_at,
+        "end_at": end_at,
+        "cbr": cbr,
+    })
+
+
+@check
+def outdated_manifest():
+    # Stored page URLs that answer 404 send the download back to a fresh chapter HTML
+    server = Server(chapters=2, pages=3, page_size=1000)
+    try:
+        service = get_service("WeebCentral", server)
+        result = download(service, "outdated_manifest", 1, 1)
+
+        server.source.image_folder = "moved"
+        os.remove(os.path.join(result["output"], "0001", "002.png"))
+        server.source.log.clear()
+
+        download(service, "outdated_manifest", 1, 1)
+        paths = server.get_paths()
+        assert "/chapters/C00001/images" in paths, f"chapter HTML was not requested again: {paths}"
+        assert "/moved/C00001/002.png" in paths, f"page was not fetched from its new URL: {paths}"
+        assert os.path.isfile(os.path.join(result["output"], "0001", "002.png"))
+    finally:
+        server.close()
+
+
+@check
+def prefetched_pages():
+    # Page lists stored by a prefetch leave only the images to the download
+    from src.services.prefetch import Prefetcher
+
+    server = Server(chapters=4, pages=3, page_size=1000)
+    try:
+        service = get_service("WeebCentral", server)
+        download(service, "prefetched_pages", 1, 1)
+
+        prefetcher = Prefetcher(2)
+        prefetcher.services["WeebCentral"] = get_service("WeebCentral", server)
+        prefetcher.prefetch("WeebCentral", "prefetched_pages").result()
+        for number in (2, 3):
+            chapter = service._get_chapter_row({"directory": 1, "number": number})
+            assert service.chapter_repository.get_pages(chapter), f"no stored pages for chapter {number}"
+
+        server.source.log.clear()
+        download(service, "prefetched_pages", 2, 3)
+        paths = [path for path in server.get_paths() if path.startswith("/chapters/")]
+        assert not paths, f"chapter HTML requested after the prefetch: {paths}"
+    finally:
+        server.close()
+
+
+@check
+def failed_chapter_progress():
+    # A chapter that fails keeps itself and the ones after it out of the last downloaded chapter
+    from src.repositories.manga import MangaRepository
+
+    server = Server(chapters=3, pages=3, page_size=1000)
+    try:
+        service = get_service("WeebCentral", server)
+        server.source.missing.add("C00001")
+        try:
+            download(service, "failed_chapter_progress", 1, 3)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("the download of a missing chapter did not fail")
+
+        last_downloaded = MangaRepository().get_by_name("failed_chapter_progress").last_downloaded
+        assert last_downloaded == 1, f"last downloaded chapter moved to {last_downloaded} with chapter 1 missing"
+
+        server.source.missing.clear()
+        download(service, "failed_chapter_progress", 1, 3)
+        last_downloaded = MangaRepository().get_by_name("failed_chapter_progress").last_downloaded
+        assert last_downloaded == 3, f"last downloaded chapter is {last_downloaded} after every chapter finished"
+    finally:
+        server.close()
+
+
+def get_partial_archives(folder: str) -> list[str]:
+    return [name for _, _, names in os.walk(folder) for name in names if name.endswith(".cbr.part")]
+
+
+@check
+def failed_job_metrics():
+    # A job that fails still dumps its metrics, the HTTP request counts among them
+    from src.services.metrics import Metrics
+
+    server = Server(chapters=2, pages=3, page_size=1000)
+    metrics = Metrics.get_metrics()
+    metrics.json_file = os.path.join(os.getcwd(), "failed_job_metrics.json")
+    try:
+        service = get_service("WeebCentral", server)
+        server.source.missing.add("C00001")
+        try:
+            download(service, "failed_job_metrics", 1, 2)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("the download of a missing chapter did not fail")
+
+        assert os.path.isfile(metrics.json_file), "no metrics were dumped for the failed job"
+        with open(metrics.json_file, "r", encoding="utf-8") as file:
+            counters = json.load(file)["counters"]
+        host = server.base_url.split("://", 1)[1]
+        assert counters.get("requests", {}).get("http", {}).get(host), f"no HTTP requests in the metrics: {counters}"
+    finally:
+        metrics.json_file = None
+        server.close()
+
+
+@check
+def archive_order():
+    # Pages finishing out of order still go into the archive in page order
+    server = Server(chapters=1, pages=6, page_size=1000)
+    try:
+        server.source.page_delays = {"001.png": 0.4, "003.png": 0.2}
+        service = get_service("WeebCentral", server)
+        result = download(service, "archive_order", 1, 1, cbr=True)
+
+        with zipfile.ZipFile(os.path.join(result["output"], "0001.cbr")) as archive:
+            names = archive.namelist()
+        assert names == [f"{page:03}.png" for page in range(1, 7)], f"archive entries out of order: {names}"
+    finally:
+        server.close()
+
+
+@check
+def cancelled_archive():
+    # A job cancelled while its chapters are archived leaves no partial archive or archive thread
+    server = Server(chapters=3, pages=20, page_size=64 * 1024, bandwidth=256 * 1024)
+    try:
+        service = get_service("WeebCentral", server)
+        service.search_chapters("cancelled_archive")
+        output = os.path.join(os.getcwd(), "cancelled_archive")
+        future = service.http_client.submit(service.get_files_async({
+            "output": output,
+            "directory_option": 1,
+            "download_option": "Range",
+            "start_at": 1,
+            "end_at": 3,
+            "cbr": True,
+        }))
+
+        deadline = time.monotonic() + 30
+        while not get_partial_archives(output):
+            assert time.monotonic() < deadline and not future.done(), "no archive was started"
+            time.sleep(0.05)
+
+        future.cancel()
+        deadline = time.monotonic() + 10
+        while any(thread.name.startswith("archive") for thread in threading.enumerate()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        parts = get_partial_archives(output)
+        assert not parts, f"partial archives left behind: {parts}"
+        threads = [thread.name for thread in threading.enumerate() if thread.name.startswith("archive")]
+        assert not threads, f"archive threads still alive: {threads}"
+    finally:
+        server.close()
+
+
+@check
+def shared_page_slots():
+    # Two jobs at once stay within the client's page slots, not twice as many
+    from src.services.http_client import HttpClient
+
+    server = Server(chapters=4, pages=20, page_size=32 * 1024, latency=0.02)
+    client = HttpClient.get_client()
+    page_slots = client._page_slots
+    client._page_slots = asyncio.Semaphore(6)
+    try:
+        services = [get_service("WeebCentral", server) for _ in range(2)]
+        for index, service in enumerate(services):
+            service.search_chapters(f"shared_page_slots_{index}")
+
+        async def get_all():
+            return await asyncio.gather(*[
+                service.get_files_async({
+                    "output": os.path.join(os.getcwd(), f"shared_page_slots_{index}"),
+                    "directory_option": 1,
+                    "download_option": "Range",
+                    "start_at": 1,
+                    "end_at": 4,
+                    "cbr": False,
+                })
+                for index, service in enumerate(services)
+            ])
+
+        server.source.peak_active = 0
+        client.run(get_all())
+        assert server.source.peak_active <= 6, f"{server.source.peak_active} pages were downloading at once"
+    finally:
+        client._page_slots = page_slots
+        server.close()
+
+
+@check
+def half_open_breaker():
+    # Once the reset timeout is over a single request probes the host, the others are still rejected
+    from src.services.retry import CircuitBreaker, CircuitOpenError
+
+    def is_rejected(breaker: CircuitBreaker) -> bool:
+        try:
+            breaker.check()
+        except CircuitOpenError:
+            return True
+        return False
+
+    breaker = CircuitBreaker("host", failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert not is_rejected(breaker), "the probe was rejected"
+    assert is_rejected(breaker), "a second request went through while the probe runs"
+
+    breaker.record_failure()
+    assert not is_rejected(breaker), "no new probe after the failed one"
+    breaker.release()
+    assert not is_rejected(breaker), "no new probe after a released one"
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    assert not is_rejected(breaker) and not is_rejected(breaker), "a closed breaker rejected requests"
+
+
+@check
+def resumed_page():
+    # An interrupted page continues from its .part file, only the missing bytes are fetched
+    from src.services.http_client import HttpClient
+
+    server = Server(page_size=256 * 1024, bandwidth=256 * 1024)
+    client = HttpClient.get_client()
+    try:
+        url = f"{server.base_url}/images/C00001/001.png"
+        save_path = os.path.join(os.getcwd(), "resumed_page.png")
+        try:
+            client.run(asyncio.wait_for(client.download(url, save_path), 0.3))
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("the throttled download was not interrupted")
+
+        offset = os.path.getsize(f"{save_path}.part")
+        assert 0 < offset < len(server.source.body), f"{offset} bytes left in the .part file"
+
+        server.source.bandwidth = 0
+        server.source.log.clear()
+        result = client.run(client.download(url, save_path))
+
+        ranges = [headers.get("Range") for _, headers in server.source.log]
+        assert ranges == [f"bytes={offset}-"], f"resumed with {ranges} after {offset} bytes"
+        assert result["received"] == len(server.source.body) - offset, f"{result['received']} bytes fetched again"
+        assert result["md5"] == hashlib.md5(server.source.body).hexdigest(), "md5 of the resumed page is wrong"
+        with open(save_path, "rb") as file:
+            assert file.read() == server.source.body, "resumed page differs from the source"
+    finally:
+        server.close()
+
+
+@check
+def chunked_budget():
+    # Bodies without a Content-Length, together bigger than the memory budget, all arrive
+    from src.services.concurrency import ByteBudget
+    from src.services.http_client import HttpClient
+
+    server = Server(page_size=300 * 1024, bandwidth=2 * 1024 * 1024, chunked=True)
+    client = HttpClient.get_client()
+    budget = client.budget
+    client.budget = ByteBudget(512 * 1024)
+    try:
+        url = f"{server.base_url}/images/C00001/001.png"
+
+        async def get_all():
+            return await asyncio.wait_for(asyncio.gather(*[client.get(url) for _ in range(8)]), 30)
+
+        try:
+            bodies = client.run(get_all())
+        except asyncio.TimeoutError:
+            raise AssertionError("chunked bodies waited on the memory budget forever")
+
+        assert all(body == server.source.body for body in bodies), "a chunked body came back different"
+        assert client.budget.in_flight == 0, f"{client.budget.in_flight} bytes of the budget never given back"
+        assert client.budget.peak <= client.budget.limit, f"budget went up to {client.budget.peak}"
+    finally:
+        client.budget = budget
+        server.close()
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Failure scenarios of the downloads against a local fake source.")
+    parser.add_argument("--check", choices=list(CHECKS), action="append", help="repeat to pick several")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = get_parser().parse_args(argv)
+    # Cancelled downloads drop their connections mid-body, the server needn't report it
+    logging.getLogger("aiohttp.server").setLevel(logging.CRITICAL)
+    work_folder = enter_work_folder()
+
+    failures = 0
+    try:
+        for name in args.check or CHECKS:
+            try:
+                CHECKS[name]()
+                print(f"ok {name}", flush=True)
+            except Exception as e:
+                failures += 1
+                print(f"FAIL {name}: {(str(e).strip().splitlines() or [repr(e)])[-1]}", flush=True)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
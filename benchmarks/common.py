@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def enter_work_folder() -> str:
+    # The database, the HTTP cache and the downloads go to a throwaway folder,
+    # it must be the working directory before the database is opened
+    work_folder = tempfile.mkdtemp(prefix="getmymanga-bench-")
+    os.environ["XDG_CACHE_HOME"] = work_folder
+    os.chdir(work_folder)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    from src.database.schema import create_tables
+    create_tables()
+    return work_folder
+
+
+def get_peak_rss() -> int | None:
+    # Bytes, ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
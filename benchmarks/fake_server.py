@@ -0,0 +1,179 @@
+import asyncio
+import json
+import os
+import random
+
+from aiohttp import web
+
+
+CHUNK_SIZE = 16 * 1024
+
+
+# Page shapes, shared with the parser benchmark
+
+def get_weebcentral_list(base_url: str, chapters: int) -> str:
+    # Newest chapter first, followed by the "#top" link the scraper drops
+    links = [f'<a href="{base_url}/chapters/C{chapter:05}">' for chapter in range(chapters, 0, -1)]
+    links.append('<a href="#top">')
+    return "\n".join(links)
+
+
+def get_weebcentral_images(base_url: str, code: str, pages: int, folder: str = "images") -> str:
+    return "\n".join(f'<img src="{base_url}/{folder}/{code}/{page:03}.png">' for page in range(1, pages + 1))
+
+
+def get_mangaonline_list(base_url: str, name: str, chapters: int) -> str:
+    return "\n".join(
+        f'<a href="{base_url}/capitulo/{name}/{chapter}/">\nCapítulo {chapter}<span class="date">01/01/2024</span>'
+        for chapter in range(chapters, 0, -1)
+    )
+
+
+def get_mangaonline_chapter(base_url: str, name: str, chapter: str, pages: int) -> str:
+    return "\n".join(
+        f'<img src="{base_url}/wp-content/uploads/{name}/{chapter}/{page:03}.png">' for page in range(1, pages + 1)
+    )
+
+
+def get_mangasee_page(base_url: str, chapters: int, pages: int) -> str:
+    chapter_list = [
+        {"Chapter": f"1{chapter:04}0", "Type": "Chapter", "Page": str(pages), "Directory": ""}
+        for chapter in range(1, chapters + 1)
+    ]
+    host = base_url.split("://", 1)[1]
+    return f'vm.CurPathName = "{host}";\nvm.CHAPTERS = {json.dumps(chapter_list)};\n'
+
+
+class FakeSource():
+    # Local stand-in for the sources, it serves the page shapes the scrapers parse.
+    # Every response can be delayed (`latency`), throttled (`bandwidth` in bytes/s
+    # per response) or replaced by a 503 (`error_rate`) the retries must absorb.
+    # `chunked` sends the bodies without a Content-Length.
+
+    def __init__(
+        self,
+        base_url: str,
+        chapters: int = 10,
+        pages: int = 20,
+        page_size: int = 200 * 1024,
+        latency: float = 0.0,
+        bandwidth: int = 0,
+        error_rate: float = 0.0,
+        chunked: bool = False
+    ) -> None:
+        self.base_url = base_url
+        self.chapters = chapters
+        self.pages = pages
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.chunked = chunked
+        self.body = os.urandom(page_size)
+        # WeebCentral pages move here when it changes, the old URLs answer 404
+        self.image_folder = "images"
+        # Chapter codes whose WeebCentral pages answer 404
+        self.missing = set()
+        # Seconds a WeebCentral page file waits before it is sent
+        self.page_delays = {}
+        self.requests = 0
+        self.errors = 0
+        # Requests being answered at once, and the most there ever were
+        self.active = 0
+        self.peak_active = 0
+        # Path and headers of every request, the checks look at what was fetched
+        self.log = []
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        self.requests += 1
+        self.log.append((request.path, dict(request.headers)))
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+
+            if self.error_rate and random.random() < self.error_rate:
+                self.errors += 1
+                return web.Response(status=503)
+
+            return await handler(request)
+        finally:
+            self.active -= 1
+
+    async def _send(self, request: web.Request, body: bytes, content_type: str) -> web.StreamResponse:
+        # Range requests get the part they ask for, the resumed downloads use them
+        status = 200
+        headers = {"Content-Type": content_type, "Accept-Ranges": "bytes"}
+        if "Range" in request.headers:
+            start, stop, _ = request.http_range.indices(len(body))
+            if start >= stop:
+                raise web.HTTPRequestRangeNotSatisfiable(headers={"Content-Range": f"bytes */{len(body)}"})
+            headers["Content-Range"] = f"bytes {start}-{stop - 1}/{len(body)}"
+            body, status = body[start:stop], 206
+
+        if not self.bandwidth and not self.chunked:
+            return web.Response(body=body, status=status, headers=headers)
+
+        resp = web.StreamResponse(status=status, headers=headers)
+        if self.chunked:
+            resp.enable_chunked_encoding()
+        else:
+            resp.content_length = len(body)
+        await resp.prepare(request)
+        for offset in range(0, len(body), CHUNK_SIZE):
+            chunk = body[offset:offset + CHUNK_SIZE]
+            await resp.write(chunk)
+            await asyncio.sleep(len(chunk) / self.bandwidth if self.bandwidth else 0)
+        await resp.write_eof()
+        return resp
+
+    async def _html(self, request: web.Request, text: str) -> web.StreamResponse:
+        return await self._send(request, text.encode("utf-8"), "text/html")
+
+    async def image(self, request: web.Request) -> web.StreamResponse:
+        return await self._send(request, self.body, "image/png")
+
+    async def weebcentral_image(self, request: web.Request) -> web.StreamResponse:
+        if request.match_info["folder"] != self.image_folder or request.match_info["code"] in self.missing:
+            raise web.HTTPNotFound()
+        await asyncio.sleep(self.page_delays.get(request.match_info["file"], 0))
+        return await self.image(request)
+
+    # WeebCentral
+
+    async def weebcentral_list(self, request: web.Request) -> web.StreamResponse:
+        return await self._html(request, get_weebcentral_list(self.base_url, self.chapters))
+
+    async def weebcentral_images(self, request: web.Request) -> web.StreamResponse:
+        code = request.match_info["code"]
+        return await self._html(request, get_weebcentral_images(self.base_url, code, self.pages, self.image_folder))
+
+    async def mangaonline_list(self, request: web.Request) -> web.StreamResponse:
+        return await self._html(request, get_mangaonline_list(self.base_url, request.match_info["name"], self.chapters))
+
+    async def mangaonline_chapter(self, request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        chapter = request.match_info["chapter"]
+        return await self._html(request, get_mangaonline_chapter(self.base_url, name, chapter, self.pages))
+
+    async def mangasee_page(self, request: web.Request) -> web.StreamResponse:
+        return await self._html(request, get_mangasee_page(self.base_url, self.chapters, self.pages))
+
+    def get_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/series/{name}/full-chapter-list", self.weebcentral_list)
+        app.router.add_get("/chapters/{code}/images", self.weebcentral_images)
+        app.router.add_get("/manga/{name}/", self.mangaonline_list)
+        app.router.add_get("/capitulo/{name}/{chapter}/", self.mangaonline_chapter)
+        app.router.add_get("/wp-content/uploads/{name}/{chapter}/{file}", self.image)
+        app.router.add_get("/read-online/{page}", self.mangasee_page)
+        app.router.add_get("/manga/{name}/{file}", self.image)
+        # Last, it would shadow the routes above
+        app.router.add_get("/{folder}/{code}/{file}", self.weebcentral_image)
+        return app
+
+
+def serve(port: int, options: dict) -> None:
+    source = FakeSource(f"http://127.0.0.1:{port}", **options)
+    web.run_app(source.get_app(), host="127.0.0.1", port=port, print=None, handle_signals=False)
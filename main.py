@@ -1,7 +1,9 @@
 from src.database.connection import Connection
+from src.database.schema import create_tables
 
 conn = Connection()
 conn.get_db().connect()
+create_tables()
 
 from src.app import App
 
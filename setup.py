@@ -1,4 +1,4 @@
-from setuptools import setup
+from setuptools import setup, find_namespace_packages
 
 setup(
     name='getmymanga', #the name of the deb package
@@ -7,8 +7,12 @@ setup(
     author_email='hms2@pm.me', # your email
     description='A way to download mangas from internet',#description
     scripts=['main.py'], # the main script
+    packages=find_namespace_packages(include=['src', 'src.*']),
+    entry_points={
+        'console_scripts': ['getmymanga-cli=src.cli:main'], # headless/batch mode
+    },
     #data_files=[('/etc/systemd/system', ['eshare.service']), ('/etc/eshare', ['eshare.conf'])], #where the files will be stored
-    install_requires=['asyncio'], #dependencies
+    install_requires=['asyncio', 'aiohttp', 'peewee'], #dependencies
     classifiers=[
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python",
@@ -1,17 +1,18 @@
 import tkinter as tk
 import customtkinter as ctk
 import logging
+import importlib
 import os
 import threading
-import requests
 
 from CTkMessagebox import CTkMessagebox as mbox
 
+from src.models.job import Job
 from src.repositories.manga import MangaRepository
-from src.services.mangasee_service import MangaseeService
-from src.services.mangaonline_service import MangaOnlineService
-from src.services.wcentral_service import WeebCentralService
-from src.services.utils import get_default_download_folder, get_sources
+from src.services.download_manager import DownloadManager
+from src.services.events import EventBus
+from src.services.prefetch import Prefetcher
+from src.services.utils import get_default_download_folder, get_service, get_sources
 
 
 logging.basicConfig()
@@ -23,12 +24,16 @@ ctk.set_default_color_theme("blue")
 
 
 class App(ctk.CTk):
+    # Widgets are updated at most this many times per second
+    FRAME_RATE = 10
+    # Milliseconds after the window shows up before the download queue starts
+    STARTUP_DELAY = 200
 
     def __init__(self):
         super().__init__()
         self.title("Get my manga!")
         window_width = 625
-        window_height = 300
+        window_height = 460
         screen_width = self.winfo_screenwidth()
         screen_height = self.winfo_screenheight()
         x = (screen_width // 2) - (window_width // 2)
@@ -38,7 +43,11 @@ class App(ctk.CTk):
         self.init_vars()
         self.create_widgets()
         self._get_history()
-        self._source_combobox(self.get_default_source())
+        self._drain_events()
+
+        # aiohttp is the slowest import, it loads in the background while the window is drawn
+        threading.Thread(target=importlib.import_module, args=("src.services.http_client",), daemon=True).start()
+        self.after(self.STARTUP_DELAY, self._on_startup)
 
     def init_vars(self):
         if "nt" == os.name:
@@ -48,7 +57,12 @@ class App(ctk.CTk):
             self.tk.call('wm', 'iconphoto', self._w, img)
 
         self.manga_repository = MangaRepository()
+        self.download_manager = None
         self.download_service = None
+        self.prefetcher = None
+        self.event_bus = EventBus.get_bus()
+        self.progress = {}
+        self.searching = False
         self.dir_option_var = tk.StringVar()
         self.download_option_var = tk.StringVar()
         # self.history_option_var = tk.StringVar()
@@ -64,6 +78,8 @@ class App(ctk.CTk):
         self._set_range(1, 5)
 
         self.checkbox_compress = tk.BooleanVar(value=False)
+        self.priority_option_var = tk.StringVar(value="Normal")
+        self.queued_job_var = tk.StringVar(value="")
 
     def create_widgets(self):
         row = 1
@@ -105,7 +121,7 @@ class App(ctk.CTk):
         self.progress_bar = ctk.CTkProgressBar(self)
         self.progress_bar.set(0)
         self.progress_bar.grid(row=row, column=0, columnspan=5, padx=5, pady=5, sticky="we")
-        self.progress_bar.configure(mode="indeterminnate")
+        self.progress_bar.configure(mode="determinate")
 
         row += 1
         self.info_label = ctk.CTkLabel(self, text="Any information loaded...")
@@ -154,9 +170,30 @@ class App(ctk.CTk):
         self.checkbox = ctk.CTkCheckBox(self, text="Compress to .cbr", variable=self.checkbox_compress)
         self.checkbox.grid(row=row, column=0, columnspan=2)
 
-        self.download_button = ctk.CTkButton(self, text="Download", state="disabled", command=lambda: self.download_chapters())
+        self.priority_combobox = ctk.CTkComboBox(
+            self,
+            state="readonly",
+            values=list(DownloadManager.PRIORITIES),
+            variable=self.priority_option_var
+        )
+        self.priority_combobox.grid(row=row, column=2, columnspan=1, padx=5, pady=5, sticky="we")
+
+        self.download_button = ctk.CTkButton(self, text="Add to queue", state="disabled", command=lambda: self.download_chapters())
         self.download_button.grid(row=row, column=3, columnspan=2, padx=5, pady=5, sticky="we")
 
+        row += 1
+        self.jobs_textbox = ctk.CTkTextbox(self, height=120)
+        self.jobs_textbox.grid(row=row, column=0, columnspan=5, padx=5, pady=5, sticky="nsew")
+        self.jobs_textbox.configure(state="disabled")
+        self.rowconfigure(row, weight=1)
+
+        row += 1
+        self.queued_combobox = ctk.CTkComboBox(self, state="readonly", values=[], variable=self.queued_job_var)
+        self.queued_combobox.grid(row=row, column=0, columnspan=3, padx=5, pady=5, sticky="we")
+
+        self.cancel_button = ctk.CTkButton(self, text="Cancel job", command=lambda: self.cancel_job())
+        self.cancel_button.grid(row=row, column=3, columnspan=2, padx=5, pady=5, sticky="we")
+
         # define the grid
         # self.columnconfigure(0, weight=0)
         self.columnconfigure((0, 1, 2, 3), weight=0)
@@ -188,7 +225,10 @@ class App(ctk.CTk):
             self._set_disabled_state([self.chap_start, self.chap_end])
 
     def _default_state(self):
+        self.searching = False
         self.progress_bar.stop()
+        self.progress_bar.configure(mode="determinate")
+        self.progress_bar.set(0)
         self._set_normal_state([
             self.history_combobox,
             self.source_combobox,
@@ -196,11 +236,14 @@ class App(ctk.CTk):
             self.info_combobox,
             self.download_button,
             self.checkbox,
+            self.priority_combobox,
             self.chap_start,
             self.chap_end
         ])
 
     def _down_state(self):
+        self.searching = True
+        self.progress_bar.configure(mode="indeterminate")
         self.progress_bar.start()
         self._set_disabled_state([self.chap_start, self.chap_end])
         self._set_disabled_state([
@@ -209,7 +252,8 @@ class App(ctk.CTk):
             self.source_combobox,
             self.info_combobox,
             self.download_button,
-            self.checkbox]
+            self.checkbox,
+            self.priority_combobox]
         )
 
     def _set_range(self, first_one, last_one):
@@ -232,34 +276,58 @@ class App(ctk.CTk):
             self._set_directory(manga.available_directories)
             self.dir_option_var.set(manga.last_directory)
 
+            self._prefetch(name)
+
     def _source_combobox(self, event=None):
-        if event == get_sources()[0]:
-            self.download_service = WeebCentralService()
+        # Created on the next search, the source module is only imported then
+        self.download_service = None
 
-        elif event == get_sources()[1]:
-            self.download_service = MangaOnlineService()
+    def _on_startup(self):
+        self._get_download_manager()
 
-        else:
-            self.download_service = MangaseeService()
+        # The title shown in the history is likely the next one searched
+        if name := self.history_option_var.get():
+            if self.manga_repository.get_by_name(name):
+                self._prefetch(name)
+
+    def _prefetch(self, name: str):
+        if self.prefetcher is None:
+            self.prefetcher = Prefetcher()
+        self.prefetcher.prefetch(self.source_option_var.get(), name)
+
+    def _get_download_manager(self) -> DownloadManager:
+        # Jobs left by the last session start running as soon as it is created
+        if self.download_manager is None:
+            self.download_manager = DownloadManager()
+            self.download_manager.start()
+        return self.download_manager
 
     def _set_directory(self, directories: int):
          self.dir_combobox.configure(values=[str(i) for i in range(1, directories + 1)])
 
-    def _get_directories(self):
-        manga_name = self.manga_name_var.get().replace(" ", "")
-        manga_history = self.history_option_var.get()
-
-        if manga_name == "" and manga_history == "":
-            mbox(title="Info", message="Inform a manga name or select from history!")
-            return
-        else:
-            manga_name = manga_name if manga_name != "" else manga_history
+    async def _search(self, service, source: str, manga_name: str):
+        # Runs on the HTTP client loop, the result reaches the widgets through the event bus
+        try:
+            if self.prefetcher is not None:
+                await self.prefetcher.wait(source, manga_name)
+            manga_dict = await service.search_chapters_async(manga_name)
+            self.event_bus.publish({"type": "search", "manga_dict": manga_dict, "error": None})
+        except Exception as e:
+            self.event_bus.publish({"type": "search", "manga_dict": None, "error": e})
 
-        self._down_state()
+    def _on_search(self, event: dict):
         message = ""
 
-        try:
-            manga_dict = self.download_service.search_chapters(manga_name)
+        if error := event["error"]:
+            # Already loaded by the search itself
+            import aiohttp
+
+            if isinstance(error, aiohttp.ClientConnectionError):
+                mbox(title="Warning", message="Could not connect to server", icon="warning", option_1="Cancel")
+            else:
+                mbox(title="Error", message=f"Something went wrong.\n\n{error}", icon="cancel", option_1="Close")
+        else:
+            manga_dict = event["manga_dict"]
             self.available_directories = manga_dict["directories"]
 
             direcotory_count = len(self.available_directories)
@@ -268,20 +336,106 @@ class App(ctk.CTk):
             self._set_directory(len(self.available_directories))
 
             message = f"{direcotory_count} directories founded with {chapters_count} chapters available!"
-        except requests.exceptions.ConnectionError:
-            mbox(title="Warning", message="Could not connect to server", icon="warning", option_1="Cancel")
-        except Exception as e:
-            mbox(title="Error", message=f"Something went wrong.\n\n{e}", icon="cancel", option_1="Close")
-        finally:
-            self.info_label.configure(text=message)
-            self._get_history()
-            self._default_state()
+
+        self.info_label.configure(text=message)
+        self._get_history()
+        self._default_state()
 
     def search_chapters(self):
-        threading.Thread(target=lambda: self._get_directories(), args=(), daemon=True).start()
+        manga_name = self.manga_name_var.get().replace(" ", "")
+        manga_history = self.history_option_var.get()
+
+        if manga_name == "" and manga_history == "":
+            mbox(title="Info", message="Inform a manga name or select from history!")
+            return
+        else:
+            manga_name = manga_name if manga_name != "" else manga_history
+
+        if self.download_service is None:
+            self.download_service = get_service(self.source_option_var.get())
 
-    def _download_files(self):
         self._down_state()
+        self.download_service.http_client.submit(
+            self._search(self.download_service, self.source_option_var.get(), manga_name)
+        )
+
+    def _drain_events(self):
+        # Only the Tk thread touches the widgets, the workers publish and this loop catches up
+        jobs_changed = False
+        for event in self.event_bus.drain():
+            if event["type"] == "search":
+                self._on_search(event)
+            elif event["type"] == "progress":
+                self.progress[event["job"]] = event
+                jobs_changed = True
+            elif event["type"] == "status":
+                jobs_changed = True
+
+        if jobs_changed:
+            self._refresh_jobs()
+
+        self.after(1000 // self.FRAME_RATE, self._drain_events)
+
+    def _format_progress(self, progress: dict) -> str:
+        text = (
+            f"{progress['chapters_done']}/{progress['chapters_total']} chapters, "
+            f"{progress['pages_done']}/{progress['pages_total']} pages, "
+            f"{progress['speed'] / (1024 * 1024):.1f} MB/s"
+        )
+        if progress["eta"] is not None:
+            text = f"{text}, ETA {int(progress['eta'])}s"
+        return text
+
+    def _refresh_jobs(self):
+        lines = []
+        queued = []
+        pages_done = 0
+        pages_total = 0
+
+        for job in reversed(self._get_download_manager().get_jobs()):
+            if job["status"] == Job.QUEUED:
+                queued.append(f"#{job['id']} {job['manga_name']}")
+
+            line = f"#{job['id']} {job['manga_name']} ({job['source']}) - {job['status']}"
+            if progress := self.progress.get(job["id"]):
+                line = f"{line} - {self._format_progress(progress)}"
+                if job["status"] == Job.RUNNING:
+                    pages_done += progress["pages_done"]
+                    pages_total += progress["pages_total"]
+            if job["error"]:
+                line = f"{line}: {job['error'].splitlines()[0]}"
+            lines.append(line)
+
+        if not self.searching:
+            self.progress_bar.set(pages_done / pages_total if pages_total else 0)
+
+        # Only jobs still waiting in the queue can be cancelled
+        self.queued_combobox.configure(values=queued)
+        if self.queued_job_var.get() not in queued:
+            self.queued_job_var.set(queued[0] if queued else "")
+
+        text = "\n".join(lines)
+        if text != self.jobs_textbox.get("1.0", "end-1c"):
+            self.jobs_textbox.configure(state="normal")
+            self.jobs_textbox.delete("1.0", "end")
+            self.jobs_textbox.insert("1.0", text)
+            self.jobs_textbox.configure(state="disabled")
+
+    def cancel_job(self):
+        selected = self.queued_job_var.get()
+        if selected == "":
+            mbox(title="Info", message="Select a queued job to cancel!")
+            return
+
+        job_id = int(selected.split(" ", 1)[0][1:])
+        if not self._get_download_manager().cancel(job_id):
+            mbox(title="Info", message="This job has already started!")
+
+    def download_chapters(self):
+        if self.download_service is None or self.download_service.manga_name is None:
+            mbox(title="Info", message="Search the chapters first!")
+            return
+
         try:
             params_dic = {
                 "output": self.folder_var.get(),
@@ -291,14 +445,14 @@ class App(ctk.CTk):
                 "end_at": int(self.chap_end_var.get()),
                 "cbr": self.checkbox_compress.get()
             }
+        except ValueError:
+            mbox(title="Info", message="Inform a valid chapter range!")
+            return
 
-            self.download_service.get_files(params_dic)
-            mbox(title="Info", message=f"Save it on {params_dic['output']}.")
-        except Exception as e:
-            mbox(title="Error", message=f"Something went wrong!\n\n{e}")
-        finally:
-            self._default_state()
-
-    def download_chapters(self):
-        threading.Thread(target=lambda: self._download_files(), daemon=True).start()
+        self._get_download_manager().enqueue(
+            self.source_option_var.get(),
+            self.download_service.manga_name,
+            params_dic,
+            DownloadManager.PRIORITIES[self.priority_option_var.get()]
+        )
 
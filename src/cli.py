@@ -0,0 +1,257 @@
+import argparse
+import json
+import logging
+import sys
+
+from src.database.connection import Connection
+from src.database.schema import create_tables
+from src.repositories.manga import MangaRepository
+from src.repositories.subscription import SubscriptionRepository
+from src.services.http_client import HttpClient
+from src.services.metrics import Metrics
+from src.services.scheduler import Scheduler
+from src.services.utils import get_service, get_sources
+from src.services.watchlist import Watchlist
+from src.services.writer import DiskWriter, FSYNC_POLICIES
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def print_result(result: dict) -> None:
+    print(json.dumps(result, ensure_ascii=False), flush=True)
+
+
+def get_directories(manga_dict: dict) -> dict:
+    return {str(directory): values["last_chapter"] for directory, values in manga_dict["directories"].items()}
+
+
+async def search(job: dict) -> dict:
+    service = get_service(job["source"])
+    manga_dict = await service.search_chapters_async(job["manga"])
+
+    return {
+        "source": job["source"],
+        "manga": job["manga"],
+        "status": "ok",
+        "chapters_count": manga_dict["chapters_count"],
+        "directories": get_directories(manga_dict),
+    }
+
+
+async def download(job: dict) -> dict:
+    service = get_service(job["source"])
+    manga_dict = await service.search_chapters_async(job["manga"])
+
+    directory = int(job.get("directory", 1))
+    last_chapter = get_directories(manga_dict)[str(directory)]
+
+    start_at = int(job.get("start", 1))
+    end_at = int(job.get("end", start_at))
+    if job.get("last"):
+        start_at = end_at = last_chapter
+
+    result = await service.get_files_async({
+        "output": job.get("output", ""),
+        "directory_option": directory,
+        "download_option": "Range",
+        "start_at": start_at,
+        "end_at": end_at,
+        "cbr": bool(job.get("cbr", False)),
+    })
+
+    return {
+        "source": job["source"],
+        "manga": job["manga"],
+        "status": "ok",
+        "output": result["output"],
+        "chapters": result["chapters"],
+    }
+
+
+async def run_job(action, job: dict) -> dict:
+    # A failed job is reported and never stops the others
+    try:
+        result = await action(job)
+    except Exception as e:
+        LOGGER.info("%s failed", job.get("manga"), exc_info=True)
+        result = {"source": job.get("source"), "manga": job.get("manga"), "status": "error", "error": str(e)}
+
+    print_result(result)
+    return result
+
+
+async def subscribe(args) -> dict:
+    # New chapters are the ones after `--from`, by default the current last chapter
+    service = get_service(args.source)
+    manga_dict = await service.search_chapters_async(args.manga)
+    last_chapter = get_directories(manga_dict)[str(args.directory)]
+    last_downloaded = args.start_from if args.start_from is not None else last_chapter
+
+    SubscriptionRepository().create(
+        args.manga,
+        args.source,
+        output=args.output,
+        directory=args.directory,
+        cbr=args.cbr,
+        enabled=True
+    )
+    MangaRepository().update(name=args.manga, last_downloaded=last_downloaded, last_directory=args.directory)
+
+    return {"source": args.source, "manga": args.manga, "status": "ok", "last_downloaded": last_downloaded}
+
+
+def list_subscriptions() -> None:
+    for subscription in SubscriptionRepository().get_all():
+        print_result({
+            "source": subscription.source,
+            "manga": subscription.manga.name,
+            "output": subscription.output,
+            "directory": subscription.directory,
+            "cbr": subscription.cbr,
+            "enabled": subscription.enabled,
+            "last_downloaded": subscription.manga.last_downloaded,
+            "last_checked_at": subscription.last_checked_at.isoformat() if subscription.last_checked_at else None,
+        })
+
+
+def read_batch(path: str) -> list[dict]:
+    if path == "-":
+        content = sys.stdin.read()
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            content = file.read()
+    content = content.strip()
+
+    if content.startswith("["):
+        return json.loads(content)
+
+    return [json.loads(line) for line in content.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+
+
+async def run(args) -> int:
+    if args.command == "sources":
+        for source in get_sources():
+            print(source)
+        return 0
+
+    if args.command == "subscriptions":
+        list_subscriptions()
+        return 0
+
+    if args.command == "subscribe":
+        result = await run_job(lambda _: subscribe(args), {"source": args.source, "manga": args.manga})
+        return 0 if result["status"] == "ok" else 1
+
+    if args.command == "unsubscribe":
+        count = SubscriptionRepository().delete(args.manga)
+        print_result({"manga": args.manga, "status": "ok" if count else "error", "removed": count})
+        return 0 if count else 1
+
+    if args.command == "watch":
+        results = await Watchlist(args.jobs or Watchlist.CONCURRENCY).run(download=not args.dry_run)
+        for result in results:
+            print_result(result)
+        return 0 if all(result["status"] == "ok" for result in results) else 1
+
+    if args.command == "search":
+        jobs, action = [{"source": args.source, "manga": args.manga}], search
+    elif args.command == "download":
+        jobs, action = [{
+            "source": args.source,
+            "manga": args.manga,
+            "start": args.start,
+            "end": args.end if args.end is not None else args.start,
+            "last": args.last,
+            "directory": args.directory,
+            "output": args.output,
+            "cbr": args.cbr,
+        }], download
+    else:
+        jobs, action = read_batch(args.file), download
+
+    # Every job shares the client loop and its connection pool
+    results = await Scheduler(args.jobs or 4).run([run_job(action, job) for job in jobs])
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="getmymanga-cli", description="Download mangas without the GUI.")
+    parser.add_argument("--jobs", type=int, help="mangas processed at the same time")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--metrics", metavar="FILE", help="write the per-stage timings as JSON after each job")
+    parser.add_argument("--textfile", metavar="FILE", help="write the per-stage timings as a Prometheus textfile")
+    parser.add_argument("--memory-budget", type=int, metavar="MB", help="response bytes held in memory at once")
+    parser.add_argument(
+        "--fsync",
+        choices=FSYNC_POLICIES,
+        default=DiskWriter.FSYNC,
+        help="flush the pages to disk after each file, after each chapter or never"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("sources", help="list the available sources")
+
+    search_parser = commands.add_parser("search", help="list the chapters of a manga")
+    search_parser.add_argument("source")
+    search_parser.add_argument("manga", help="name/code from the site URL")
+
+    download_parser = commands.add_parser("download", help="download a chapter range")
+    download_parser.add_argument("source")
+    download_parser.add_argument("manga", help="name/code from the site URL")
+    download_parser.add_argument("--start", type=int, default=1)
+    download_parser.add_argument("--end", type=int)
+    download_parser.add_argument("--last", action="store_true", help="only the last chapter")
+    download_parser.add_argument("--directory", type=int, default=1)
+    download_parser.add_argument("--output", default="")
+    download_parser.add_argument("--cbr", action="store_true", help="compress each chapter to .cbr")
+
+    batch_parser = commands.add_parser("batch", help="run the downloads listed in a JSON file")
+    batch_parser.add_argument(
+        "file",
+        help="JSON list or JSON lines with source, manga, start, end, last, directory, output and cbr, '-' reads stdin"
+    )
+
+    subscribe_parser = commands.add_parser("subscribe", help="add a manga to the watchlist")
+    subscribe_parser.add_argument("source")
+    subscribe_parser.add_argument("manga", help="name/code from the site URL")
+    subscribe_parser.add_argument("--from", dest="start_from", type=int, help="last chapter already downloaded")
+    subscribe_parser.add_argument("--directory", type=int, default=1)
+    subscribe_parser.add_argument("--output", default="")
+    subscribe_parser.add_argument("--cbr", action="store_true", help="compress each chapter to .cbr")
+
+    unsubscribe_parser = commands.add_parser("unsubscribe", help="remove a manga from the watchlist")
+    unsubscribe_parser.add_argument("manga")
+
+    commands.add_parser("subscriptions", help="list the watchlist")
+
+    watch_parser = commands.add_parser("watch", help="check every tracked manga and download the new chapters")
+    watch_parser.add_argument("--dry-run", action="store_true", help="only report the new chapters")
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = get_parser().parse_args(argv)
+
+    # Results go to stdout, logs to stderr so the output can be piped
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO if args.verbose else logging.WARNING)
+    Connection.get_db().connect(reuse_if_open=True)
+    create_tables()
+
+    metrics = Metrics.get_metrics()
+    metrics.json_file = args.metrics
+    metrics.textfile = args.textfile
+
+    if args.memory_budget:
+        HttpClient.MEMORY_BUDGET = args.memory_budget * 1024 * 1024
+    DiskWriter.FSYNC = args.fsync
+
+    try:
+        return HttpClient.get_client().run(run(args))
+    finally:
+        metrics.dump()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
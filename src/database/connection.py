@@ -6,7 +6,10 @@ class Connection():
 
     @staticmethod
     def _create_connection():
-        Connection.DB = SqliteDatabase('getmymanga.db')
+        Connection.DB = SqliteDatabase('getmymanga.db', pragmas={
+            'journal_mode': 'wal',
+            'foreign_keys': 1,
+        })
         return Connection.DB
 
     @staticmethod
@@ -0,0 +1,15 @@
+from src.database.connection import Connection
+from src.models.chapter import Chapter
+from src.models.job import Job
+from src.models.manga import Manga
+from src.models.page import Page
+from src.models.source import Source
+from src.models.subscription import Subscription
+
+
+MODELS = [Manga, Source, Chapter, Page, Subscription, Job]
+
+
+def create_tables() -> None:
+    # Called once at startup by main.py and the CLI, not when a repository is imported
+    Connection.get_db().create_tables(MODELS)
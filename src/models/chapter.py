@@ -0,0 +1,20 @@
+from peewee import Model, CharField, IntegerField, TextField, ForeignKeyField
+
+from src.database.connection import Connection
+from src.models.source import Source
+
+
+class Chapter(Model):
+    source = ForeignKeyField(Source, backref="chapters", on_delete="CASCADE")
+    directory = IntegerField(default=1)
+    number = IntegerField()
+    position = IntegerField()
+    url = CharField(null=True)
+    data = TextField(default="{}")
+
+    class Meta:
+        database = Connection.get_db()
+        indexes = (
+            (("source", "directory", "number"), True),
+            (("source", "url"), False),
+        )
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from peewee import Model, CharField, IntegerField, TextField, DateTimeField
+
+from src.database.connection import Connection
+
+
+class Job(Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    source = CharField()
+    manga_name = CharField()
+    params = TextField(default="{}")
+    priority = IntegerField(default=1)
+    status = CharField(default=QUEUED)
+    error = TextField(null=True)
+    created_at = DateTimeField(default=datetime.now)
+    updated_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = Connection.get_db()
+        indexes = (
+            (("status", "priority", "created_at"), False),
+        )
@@ -0,0 +1,19 @@
+from peewee import Model, CharField, IntegerField, ForeignKeyField
+
+from src.database.connection import Connection
+from src.models.chapter import Chapter
+
+
+class Page(Model):
+    chapter = ForeignKeyField(Chapter, backref="pages", on_delete="CASCADE")
+    number = IntegerField()
+    url = CharField()
+    file_name = CharField()
+    size = IntegerField(null=True)
+    md5 = CharField(null=True)
+
+    class Meta:
+        database = Connection.get_db()
+        indexes = (
+            (("chapter", "number"), True),
+        )
@@ -0,0 +1,18 @@
+from peewee import Model, CharField, IntegerField, DateTimeField, ForeignKeyField
+
+from src.database.connection import Connection
+from src.models.manga import Manga
+
+
+class Source(Model):
+    name = CharField()
+    manga = ForeignKeyField(Manga, backref="sources", on_delete="CASCADE")
+    chapters_count = IntegerField(default=0)
+    available_directories = IntegerField(default=1)
+    refreshed_at = DateTimeField(null=True)
+
+    class Meta:
+        database = Connection.get_db()
+        indexes = (
+            (("manga", "name"), True),
+        )
@@ -0,0 +1,20 @@
+from peewee import Model, CharField, IntegerField, BooleanField, DateTimeField, ForeignKeyField
+
+from src.database.connection import Connection
+from src.models.manga import Manga
+
+
+class Subscription(Model):
+    manga = ForeignKeyField(Manga, backref="subscriptions", on_delete="CASCADE")
+    source = CharField()
+    output = CharField(default="")
+    directory = IntegerField(default=1)
+    cbr = BooleanField(default=False)
+    enabled = BooleanField(default=True)
+    last_checked_at = DateTimeField(null=True)
+
+    class Meta:
+        database = Connection.get_db()
+        indexes = (
+            (("manga", "source"), True),
+        )
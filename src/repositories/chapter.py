@@ -0,0 +1,111 @@
+import json
+
+from datetime import datetime, timedelta
+
+from src.database.connection import Connection
+from src.models.manga import Manga
+from src.models.source import Source
+from src.models.chapter import Chapter
+from src.models.page import Page
+
+
+class ChapterRepository:
+    BATCH_SIZE = 500
+
+    def get_source(self, manga_name: str, source_name: str) -> Source | None:
+        try:
+            return (Source
+                    .select()
+                    .join(Manga)
+                    .where((Manga.name == manga_name) & (Source.name == source_name))
+                    .get())
+        except Source.DoesNotExist:
+            return None
+
+    def is_fresh(self, source: Source | None, ttl: timedelta) -> bool:
+        if source is None or source.refreshed_at is None:
+            return False
+        return datetime.now() - source.refreshed_at < ttl
+
+    def get_chapters(self, source: Source) -> list[Chapter]:
+        return list(Chapter
+                    .select()
+                    .where(Chapter.source == source)
+                    .order_by(Chapter.directory, Chapter.position))
+
+    def get_last_chapter(self, source: Source) -> Chapter | None:
+        return (Chapter
+                .select()
+                .where(Chapter.source == source)
+                .order_by(Chapter.position.desc())
+                .first())
+
+    def _get_rows(self, source: Source, chapters: list[dict], start_at: int = 0) -> list[dict]:
+        return [
+            {
+                "source": source,
+                "directory": chapter["directory"],
+                "number": chapter["number"],
+                "position": position,
+                "url": chapter.get("url"),
+                "data": json.dumps(chapter["data"]),
+            }
+            for position, chapter in enumerate(chapters, start=start_at)
+        ]
+
+    def _insert(self, model, rows: list[dict]) -> None:
+        for i in range(0, len(rows), self.BATCH_SIZE):
+            model.insert_many(rows[i:i + self.BATCH_SIZE]).execute()
+
+    def append_index(self, source: Source, directories: int, chapters: list[dict]) -> Source:
+        # New chapters go after the stored ones, the others are kept as they are
+        with Connection.get_db().atomic():
+            self._insert(Chapter, self._get_rows(source, chapters, source.chapters_count))
+            source.chapters_count += len(chapters)
+            source.available_directories = directories
+            source.refreshed_at = datetime.now()
+            source.save()
+
+        return source
+
+    def get_chapter(self, source: Source, directory: int, number: int) -> Chapter | None:
+        try:
+            return Chapter.get((Chapter.source == source) & (Chapter.directory == directory) & (Chapter.number == number))
+        except Chapter.DoesNotExist:
+            return None
+
+    def get_pages(self, chapter: Chapter) -> list[Page]:
+        return list(Page.select().where(Page.chapter == chapter).order_by(Page.number))
+
+    def save_pages(self, chapter: Chapter, pages: list[dict]) -> None:
+        with Connection.get_db().atomic():
+            Page.delete().where(Page.chapter == chapter).execute()
+            rows = [
+                {
+                    "chapter": chapter,
+                    "number": number,
+                    "url": page["download_url"],
+                    "file_name": page["file_name"],
+                    "size": page.get("size"),
+                    "md5": page.get("md5"),
+                }
+                for number, page in enumerate(pages, start=1)
+            ]
+            self._insert(Page, rows)
+
+    def delete_pages(self, chapter: Chapter) -> int:
+        return Page.delete().where(Page.chapter == chapter).execute()
+
+    def save_index(self, manga: Manga, source_name: str, directories: int, chapters: list[dict]) -> Source:
+        with Connection.get_db().atomic():
+            source, _ = Source.get_or_create(manga=manga, name=source_name)
+            source.chapters_count = len(chapters)
+            source.available_directories = directories
+            source.refreshed_at = datetime.now()
+            source.save()
+
+            # The page manifests go with their chapters, a rebuilt list may point to other pages
+            Chapter.delete().where(Chapter.source == source).execute()
+            self._insert(Chapter, self._get_rows(source, chapters))
+
+        return source
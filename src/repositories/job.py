@@ -0,0 +1,34 @@
+import json
+
+from datetime import datetime
+
+from src.models.job import Job
+
+
+class JobRepository:
+
+    def create(self, source: str, manga_name: str, params: dict, priority: int = 1) -> Job:
+        return Job.create(source=source,
+                          manga_name=manga_name,
+                          params=json.dumps(params),
+                          priority=priority)
+
+    def get_by_id(self, id: int) -> Job | None:
+        try:
+            return Job.get(Job.id == id)
+        except Job.DoesNotExist:
+            return None
+
+    def get_pending(self) -> list[Job]:
+        # Jobs that were running when the app closed go back to the queue
+        Job.update(status=Job.QUEUED).where(Job.status == Job.RUNNING).execute()
+        return list(Job
+                    .select()
+                    .where(Job.status == Job.QUEUED)
+                    .order_by(Job.priority.desc(), Job.created_at))
+
+    def set_status(self, id: int, status: str, error: str | None = None) -> None:
+        Job.update(status=status, error=error, updated_at=datetime.now()).where(Job.id == id).execute()
+
+    def get_params(self, job: Job) -> dict:
+        return json.loads(job.params)
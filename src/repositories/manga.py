@@ -1,12 +1,8 @@
 from typing import Any
 
-from src.database.connection import Connection
 from src.models.manga import Manga
 
 
-Connection.get_db().create_tables([Manga])
-
-
 class MangaRepository:
 
     def create(self, name: str) -> Manga:
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from src.models.manga import Manga
+from src.models.subscription import Subscription
+from src.repositories.manga import MangaRepository
+
+
+class SubscriptionRepository:
+
+    def __init__(self) -> None:
+        self.manga_repository = MangaRepository()
+
+    def create(self, name: str, source: str, **kwargs) -> Subscription:
+        manga = self.manga_repository.create(name)
+        subscription, _ = Subscription.get_or_create(manga=manga, source=source)
+
+        for field in ("output", "directory", "cbr", "enabled"):
+            if field in kwargs and kwargs[field] is not None:
+                setattr(subscription, field, kwargs[field])
+
+        subscription.save()
+        return subscription
+
+    def get_by_name(self, name: str) -> list[Subscription]:
+        return list(Subscription.select().join(Manga).where(Manga.name == name))
+
+    def get_enabled(self) -> list[Subscription]:
+        return list(Subscription
+                    .select(Subscription, Manga)
+                    .join(Manga)
+                    .where(Subscription.enabled == True))
+
+    def set_checked(self, subscription: Subscription) -> None:
+        subscription.last_checked_at = datetime.now()
+        subscription.save()
+
+    def delete(self, name: str) -> int:
+        count = 0
+        for subscription in self.get_by_name(name):
+            count += subscription.delete_instance()
+        return count
+
+    def get_all(self) -> list[Subscription]:
+        return list(Subscription.select(Subscription, Manga).join(Manga))
@@ -1,19 +1,87 @@
 import asyncio
+import json
+import logging
 import os
 
+import aiohttp
+
+from datetime import timedelta
+
+from src.repositories.chapter import ChapterRepository
 from src.repositories.manga import MangaRepository
-from src.services.utils import (remove_files,
-                                get_default_download_folder,
-                                create_folder,
-                                add_leading_zeros)
+from src.services.events import ProgressTracker
+from src.services.http_client import HttpClient
+from src.services.journal import ChapterJournal
+from src.services.mirrors import FAILOVER_ERRORS
+from src.services.packager import ChapterArchive
+from src.services.scheduler import Scheduler, CHAPTER_CONCURRENCY
+from src.services.utils import get_default_download_folder
+
+
+LOGGER = logging.getLogger(__name__)
+
+# A stored page list answered with these is outdated, the chapter page is read again
+MANIFEST_GONE_STATUS = (403, 404, 410)
+
 
 class BaseService():
+    # Every source runs the same pipeline: list chapters, resolve the pages of
+    # each chapter, fetch and write them, then package the chapter. A source
+    # only builds its URLs and parses its pages through the hooks below.
+    SOURCE = ""
+    HOST = ""
+    FOLDER_SUFFIX = ""
+    CONCURRENCY = CHAPTER_CONCURRENCY
+    # Image hosts serving the same paths as the scraped one
+    MIRRORS = []
+    INDEX_TTL = timedelta(hours=6)
+    # Seconds the cached HTML is used without revalidating it
+    LIST_CACHE_TTL = 10 * 60
+    PAGE_CACHE_TTL = 7 * 24 * 60 * 60
 
     def __init__(self) -> None:
         self.compress_to_cbr = False
+        self.concurrency = self.CONCURRENCY
         self.manga_name = None
         self.manga_dict = {}
         self.manga_repository = MangaRepository()
+        self.chapter_repository = ChapterRepository()
+        self.http_client = HttpClient.get_client()
+        self.tracker = None
+
+    # Hooks
+
+    async def _get_chapter_list(self, ttl: float) -> list:
+        # Fetches and parses the chapter list, raises when it is empty
+        raise NotImplementedError()
+
+    def _add_chapters(self, manga_dict: dict, chapters: list):
+        # Adds the parsed chapter list to manga_dict, returns the last directory
+        raise NotImplementedError()
+
+    def _get_chapter_jobs(self, directory: int, chapter_detail: dict) -> list[dict]:
+        # One job per folder to download: number, folder, directory and what
+        # _get_page_items needs to find the pages
+        raise NotImplementedError()
+
+    async def _get_page_items(self, job: dict, ttl: float) -> list[dict]:
+        # download_url and file_name, relative to the chapter folder, of each page,
+        # the chapter HTML is served from the cache for `ttl` seconds
+        raise NotImplementedError()
+
+    def _get_chapter_list_url(self) -> str | None:
+        # Page listing every chapter, None when the source can't be refreshed incrementally
+        return None
+
+    def _parse_new_chapters(self, content: str, last_url: str) -> list | None:
+        # Chapters listed after `last_url`, oldest first, None when it is not on the list
+        return None
+
+    def _add_new_chapters(self, manga_dict: dict, directory: int, chapters: list) -> None:
+        # Appends the parsed new chapters after the last one of `directory`
+        raise NotImplementedError()
+
+    # Chapter list
 
     def _set_manga_dict(self, name: str) -> None:
         self.manga_repository.create(name)
@@ -24,8 +92,9 @@ class BaseService():
         }
 
     def _get_folder(self, folder: str) -> str:
+        # Created along with the chapter folders, see _download_chapters
         temp_path = folder if folder != "" else get_default_download_folder()
-        return create_folder(os.path.join(temp_path, f"{self.manga_name}_br"))
+        return os.path.join(temp_path, f"{self.manga_name}{self.FOLDER_SUFFIX}")
 
     def _get_manga_dict(self, name: str | None = None) -> dict | None:
         if name != None:
@@ -37,21 +106,340 @@ class BaseService():
         else:
             return manga_dict
 
+    def _get_directories_count(self) -> int:
+        return len(self._get_manga_dict()["directories"])
+
+    def _add_chapter(self, manga_dict: dict, directory: int, chapter: int, chapter_detail: dict) -> None:
+        directories = manga_dict["directories"]
+        if directory not in directories:
+            directories[directory] = { "chapters": {} }
+
+        directory_dict = directories[directory]
+        directory_dict["chapters"][chapter] = chapter_detail
+        directory_dict["last_chapter"] = chapter
+        manga_dict["chapters_count"] += 1
+
+    def _get_index_rows(self, manga_dict: dict) -> list[dict]:
+        return [
+            {"directory": directory, "number": chapter, "url": chapter_detail.get("URL"), "data": chapter_detail}
+            for directory, directory_dict in manga_dict["directories"].items()
+            for chapter, chapter_detail in directory_dict["chapters"].items()
+        ]
+
+    def _load_chapters(self, source) -> dict | None:
+        chapters = self.chapter_repository.get_chapters(source)
+        if len(chapters) == 0:
+            return None
+
+        manga_dict = self.manga_dict[self.manga_name]
+        for chapter in chapters:
+            self._add_chapter(manga_dict, chapter.directory, chapter.number, json.loads(chapter.data))
+
+        return manga_dict
+
+    def _load_index(self) -> dict | None:
+        # Rebuilds manga_dict from the stored chapter index while it is fresh
+        source = self.chapter_repository.get_source(self.manga_name, self.SOURCE)
+        if not self.chapter_repository.is_fresh(source, self.INDEX_TTL):
+            return None
+
+        return self._load_chapters(source)
+
+    async def _refresh_index(self, ttl: float) -> dict | None:
+        # Parses the chapter list only down to the newest stored chapter and
+        # appends what is above it, None when the list has to be rebuilt
+        url = self._get_chapter_list_url()
+        source = self.chapter_repository.get_source(self.manga_name, self.SOURCE)
+        last = self.chapter_repository.get_last_chapter(source) if url and source else None
+        if last is None or not last.url:
+            return None
+
+        content = await self.http_client.get_text(url, ttl, "chapter_list")
+        with self.http_client.metrics.timer("parse", url):
+            chapters = self._parse_new_chapters(content, last.url)
+
+        if chapters is None or (manga_dict := self._load_chapters(source)) is None:
+            return None
+
+        previous = manga_dict["directories"][last.directory]["last_chapter"]
+        try:
+            self._add_new_chapters(manga_dict, last.directory, chapters)
+        except Exception:
+            LOGGER.info("%s: new chapters don't follow the stored ones", self.manga_name, exc_info=True)
+            self._set_manga_dict(self.manga_name)
+            return None
+
+        rows = [row for row in self._get_index_rows(manga_dict) if row["directory"] == last.directory and row["number"] > previous]
+        self.chapter_repository.append_index(source, len(manga_dict["directories"]), rows)
+        self.manga_repository.update(name=self.manga_name, available_directories=len(manga_dict["directories"]))
+        LOGGER.info("%s: %d new chapters on %s", self.manga_name, len(rows), self.SOURCE)
+
+        return manga_dict
+
+    def _save_index(self) -> None:
+        manga_dict = self.manga_dict[self.manga_name]
+        self.chapter_repository.save_index(
+            self.manga_repository.get_by_name(self.manga_name),
+            self.SOURCE,
+            len(manga_dict["directories"]),
+            self._get_index_rows(manga_dict)
+        )
+
     def _get_directory(self, directory: int) -> dict:
-        return self._get_manga_dict()["directories"][directory]
+        return self._get_manga_dict()["directories"][int(directory)]
 
-    def _override_chapter_folder(self, output, chapter):
-        folder = add_leading_zeros(chapter, 4)
-        path = os.path.join(output, folder)
+    def search_chapters(self, manga_name: str, refresh: bool = False) -> dict:
+        return self.http_client.run(self.search_chapters_async(manga_name, refresh))
 
-        if os.path.isdir(path):
-            remove_files(path)
+    async def search_chapters_async(self, manga_name: str, refresh: bool = False) -> dict:
+        # `refresh` skips the stored index and revalidates the cached chapter list
+        if refresh:
+            self.manga_dict.pop(manga_name, None)
 
-        os.mkdir(os.path.join(output, folder))
+        if manga_dict := self._get_manga_dict(manga_name):
+            return manga_dict
 
-    async def _chunk_routines(self, coroutines):
-        if len(coroutines) > 5:
-            for chunk in [coroutines[i:i + 5] for i in range(0, len(coroutines), 5)]:
-                await asyncio.gather(*chunk)
-        else:
-            await asyncio.gather(*coroutines)
\ No newline at end of file
+        if not refresh and (manga_dict := self._load_index()):
+            return manga_dict
+
+        ttl = 0 if refresh else self.LIST_CACHE_TTL
+        if manga_dict := await self._refresh_index(ttl):
+            return manga_dict
+
+        chapters = await self._get_chapter_list(ttl)
+        last_directory = self._add_chapters(self._get_manga_dict(), chapters)
+
+        self.manga_repository.update(name=self.manga_name, available_directories=last_directory)
+        self._save_index()
+
+        return self._get_manga_dict()
+
+    # Download
+
+    async def _download_and_save_page(
+        self,
+        folder: str,
+        item: dict,
+        journal: ChapterJournal,
+        archive: ChapterArchive | None = None
+    ) -> None:
+        save_path = os.path.join(folder, item["file_name"])
+
+        # A page on disk that doesn't match the stored manifest is fetched again
+        if item.get("size") and journal.is_done(save_path) and os.path.getsize(save_path) != item["size"]:
+            os.remove(save_path)
+
+        # Best mirror first, a failed page moves on to the next one
+        urls = self.http_client.mirrors.get_urls(item["download_url"])
+        first_error = None
+        for index, url in enumerate(urls):
+            try:
+                # Size is checked against Content-Length while streaming, no need to read the file back
+                await journal.download(self.http_client, url, save_path)
+                break
+            except FAILOVER_ERRORS as e:
+                # The mirrors are only a fallback, the best host's error is the one reported
+                first_error = first_error or e
+                if index == len(urls) - 1:
+                    raise first_error
+                self.http_client.metrics.increment("failovers", "image", url)
+                LOGGER.info("Page %s failed on %s, trying %s", item["file_name"], url, urls[index + 1])
+
+        self.tracker.page_done(os.path.getsize(save_path))
+
+        if archive:
+            await archive.add(save_path)
+
+    def _get_chapter_row(self, job: dict):
+        # Jobs sharing a chapter row with another one (Mangasee's ".5") keep no manifest
+        if not job.get("manifest", True):
+            return None
+
+        source = self.chapter_repository.get_source(self.manga_name, self.SOURCE)
+        return self.chapter_repository.get_chapter(source, job["directory"], job["number"]) if source else None
+
+    async def _get_items(self, job: dict, chapter) -> tuple[list[dict], bool]:
+        # The page list stored by a previous download skips the chapter HTML, True when it was used
+        if chapter is not None and (pages := self.chapter_repository.get_pages(chapter)):
+            return [
+                {"download_url": page.url, "file_name": page.file_name, "size": page.size, "md5": page.md5}
+                for page in pages
+            ], True
+
+        return await self._get_page_items(job, self.PAGE_CACHE_TTL), False
+
+    def _save_manifest(self, chapter, items: list[dict], journal: ChapterJournal, cached: bool) -> None:
+        # Sizes and hashes come from the journal, they check the pages of a later repair
+        if chapter is None or (cached and all(item.get("size") for item in items)):
+            return
+
+        pages = []
+        for item in items:
+            page = journal.pages.get(os.path.basename(item["file_name"]), {})
+            pages.append({**item, "size": page.get("size"), "md5": page.get("md5")})
+        self.chapter_repository.save_pages(chapter, pages)
+
+    async def _download_pages(self, folder: str, items: list[dict], journal: ChapterJournal, archive) -> None:
+        if items:
+            await self.http_client.mirrors.probe(items[0]["download_url"], self.MIRRORS)
+        self.tracker.add_pages(len(items))
+        if archive:
+            await archive.set_pages([item["file_name"] for item in items])
+
+        await self._get_scheduler().run_pages(
+            [self._download_and_save_page(folder, item, journal, archive) for item in items]
+        )
+
+    async def _download_and_save_chapter(self, output: str, job: dict) -> None:
+        folder = os.path.join(output, job["folder"])
+        archive = ChapterArchive(folder) if self.compress_to_cbr else None
+
+        try:
+            journal = await ChapterJournal.open(folder)
+            chapter = self._get_chapter_row(job)
+            items, cached = await self._get_items(job, chapter)
+            self.tracker.chapter(job["folder"], "downloading")
+
+            try:
+                await self._download_pages(folder, items, journal, archive)
+            except aiohttp.ClientResponseError as e:
+                if not cached or e.status not in MANIFEST_GONE_STATUS:
+                    raise
+
+                # The cached chapter HTML was read with the manifest, it has the same dead URLs
+                LOGGER.info("Stored pages of %s are outdated, reading the chapter again", job["folder"])
+                self.chapter_repository.delete_pages(chapter)
+                items, cached = await self._get_page_items(job, 0), False
+                await self._download_pages(folder, items, journal, archive)
+
+            self._save_manifest(chapter, items, journal, cached)
+            await self.http_client.writer.sync_folder(folder)
+
+            if archive:
+                await archive.close()
+
+            self.tracker.chapter(job["folder"], "done")
+
+        except asyncio.TimeoutError:
+            self.tracker.chapter(job["folder"], "failed")
+            if archive:
+                await archive.abort()
+            raise Exception(f"Timeout in downloading chapter {job['folder']}!")
+
+        except Exception as e:
+            self.tracker.chapter(job["folder"], "failed")
+            if archive:
+                await archive.abort()
+            raise Exception(f"Error on download and save chapter!\n\n{e}")
+
+        except BaseException:
+            # Cancelled, the partial archive and its thread must not outlive the job
+            if archive:
+                await asyncio.shield(archive.abort())
+            raise
+
+    async def _download_chapters(self, output: str, directory: int, chapter_details: list) -> list:
+        coroutines = []
+        # Kept between runs, the chapter journal tells which pages are still missing
+        folders = [output]
+        chapters = []
+        jobs = []
+        finished = set()
+
+        for chapter_detail in chapter_details:
+            for job in self._get_chapter_jobs(directory, chapter_detail):
+                folders.append(os.path.join(output, job["folder"]))
+                coroutines.append(self._track_chapter(output, job, finished, len(jobs)))
+                jobs.append(job)
+
+                if not chapters or chapters[-1] != job["number"]:
+                    chapters.append(job["number"])
+
+        try:
+            await self.http_client.writer.makedirs(folders)
+            await self._run_routines(coroutines)
+        finally:
+            # Only what is on disk counts, a failed or cancelled chapter is downloaded again next time
+            last_job = self._get_last_finished(jobs, finished)
+            if last_job is not None:
+                self.manga_repository.update(name=self.manga_name, last_downloaded=last_job["number"], last_directory=last_job["directory"])
+
+        return chapters
+
+    async def _track_chapter(self, output: str, job: dict, finished: set, index: int) -> None:
+        # The download starts in here, one that never starts has nothing left unawaited
+        await self._download_and_save_chapter(output, job)
+        finished.add(index)
+
+    def _get_last_finished(self, jobs: list, finished: set) -> dict | None:
+        # The last job of the run finished from the first one, a chapter split
+        # in several jobs only counts once all of them are done
+        pending = {job["number"] for index, job in enumerate(jobs) if index not in finished}
+        last_job = None
+        for job in jobs:
+            if job["number"] in pending:
+                break
+            last_job = job
+        return last_job
+
+    def _get_scheduler(self) -> Scheduler:
+        # Cheap to build, the page slots it bounds are the client's, shared by every job
+        return Scheduler(self.concurrency, page_slots=self.http_client.page_slots)
+
+    async def _run_routines(self, coroutines) -> list:
+        return await self._get_scheduler().run(coroutines)
+
+    def _get_target_chapters(self, directory: dict, start_at: int, end_at: int) -> list:
+        return [
+            directory["chapters"][chapter]
+            for chapter in range(start_at, min(end_at, directory["last_chapter"]) + 1)
+            if chapter in directory["chapters"]
+        ]
+
+    def get_files(self, params_dic) -> dict:
+        return self.http_client.run(self.get_files_async(params_dic))
+
+    async def get_files_async(self, params_dic) -> dict:
+        start_at = 1
+        end_at = 1
+
+        if params_dic["download_option"] == "Range":
+            start_at = params_dic["start_at"]
+            end_at = params_dic["end_at"]
+
+            if start_at > end_at:
+                end_at = start_at
+
+        self.compress_to_cbr = params_dic["cbr"]
+
+        download_folder = self._get_folder(params_dic["output"])
+
+        directory = self._get_directory(params_dic["directory_option"])
+        last_chapter = directory["last_chapter"]
+
+        if start_at > last_chapter:
+            raise Exception(f"The last chapters for this directory is {last_chapter}!")
+
+        target_chapters = self._get_target_chapters(directory, start_at, end_at)
+        if len(target_chapters) == 0:
+            raise Exception(f"Chapters not found on this directory.")
+
+        # Jobs from the download manager are reported by id, the others by manga name
+        self.tracker = ProgressTracker(params_dic.get("job_id", self.manga_name), self.manga_name, len(target_chapters))
+        self.tracker.start()
+        try:
+            chapters = await self._download_chapters(download_folder, int(params_dic["directory_option"]), target_chapters)
+        except Exception as e:
+            self.tracker.finish(e)
+            raise
+        finally:
+            # A failed job is when the retry numbers matter the most
+            LOGGER.info("HTTP stats: %s", self.http_client.get_stats())
+            LOGGER.info("Mirrors: %s", self.http_client.mirrors.to_dict())
+            self.http_client.metrics.set_gauge("inflight_bytes_peak", self.http_client.budget.peak)
+            self.http_client.metrics.set_gauge("inflight_bytes_limit", self.http_client.budget.limit)
+            self.http_client.metrics.dump()
+
+        self.tracker.finish()
+
+        return {"output": download_folder, "chapters": chapters}
@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+
+BACKOFF_STATUS = (429, 503)
+
+
+def parse_retry_after(value: str | None) -> float:
+    if not value:
+        return 0
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+class Slot():
+
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.latency = None
+        self.status = None
+        self.retry_after = None
+
+    def set_response(self, status: int, retry_after: str | None = None) -> None:
+        self.latency = time.monotonic() - self.started_at
+        self.status = status
+        self.retry_after = retry_after
+
+
+class HostController():
+    INITIAL = 4
+    MINIMUM = 1
+    MAXIMUM = 32
+    # Time to first byte above this stops the additive increase
+    LATENCY_TARGET = 2.0
+
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self.limit = float(self.INITIAL)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                wait = self.blocked_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    break
+                try:
+                    await asyncio.wait_for(condition.wait(), wait if wait > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+
+            self.in_flight += 1
+
+    def _increase(self) -> None:
+        # Additive: about one more slot for each window of successful requests
+        self.limit = min(float(self.MAXIMUM), self.limit + 1 / self.limit)
+
+    def _decrease(self, latency: float) -> None:
+        # Multiplicative, once per round trip so a burst of failures counts as one signal
+        now = time.monotonic()
+        if now - self._last_decrease < max(latency, 1.0):
+            return
+
+        self._last_decrease = now
+        self.limit = max(float(self.MINIMUM), self.limit / 2)
+
+    async def release(self, slot: Slot, failed: bool = False) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            latency = slot.latency if slot.latency is not None else time.monotonic() - slot.started_at
+
+            if failed or slot.status in BACKOFF_STATUS:
+                self._decrease(latency)
+            elif slot.status is not None and slot.status < 500 and latency <= self.LATENCY_TARGET:
+                self._increase()
+
+            if delay := parse_retry_after(slot.retry_after):
+                self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+            condition.notify_all()
+
+
+class ConcurrencyController():
+
+    def __init__(self) -> None:
+        self.hosts = {}
+
+    def get(self, url: str) -> HostController:
+        host = urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostController(host)
+        return self.hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        controller = self.get(url)
+        await controller.acquire()
+
+        slot = Slot()
+        failed = False
+        try:
+            yield slot
+        except Exception:
+            # Timeouts and connection errors, not an HTTP status raised after the response
+            failed = slot.status is None
+            raise
+        finally:
+            await asyncio.shield(controller.release(slot, failed))
+
+
+class ByteBudget():
+    # Bytes of response bodies held in memory at once, a fetch waits for its
+    # share before reading. A body larger than the whole budget still runs,
+    # alone, so it can never wait forever.
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self.peak = 0
+        self.waiting = 0
+        self._condition = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self, size: int) -> int:
+        # Returns the bytes actually taken, the ones to give back
+        size = min(max(0, size), self.limit)
+        condition = self._get_condition()
+        async with condition:
+            self.waiting += 1
+            try:
+                await condition.wait_for(lambda: self.in_flight + size <= self.limit)
+            finally:
+                self.waiting -= 1
+            self.in_flight += size
+            self.peak = max(self.peak, self.in_flight)
+        return size
+
+    def try_acquire(self, size: int) -> bool:
+        # Never waits, and fails while someone is waiting so a reader never grows ahead of them
+        if self.waiting or self.in_flight + size > self.limit:
+            return False
+        self.in_flight += size
+        self.peak = max(self.peak, self.in_flight)
+        return True
+
+    async def release(self, size: int) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= size
+            condition.notify_all()
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        size = await self.acquire(size)
+        try:
+            yield size
+        finally:
+            await asyncio.shield(self.release(size))
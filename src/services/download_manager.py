@@ -0,0 +1,117 @@
+import asyncio
+import itertools
+import logging
+import threading
+
+from src.models.job import Job
+from src.repositories.job import JobRepository
+from src.services.events import EventBus
+from src.services.utils import get_service
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DownloadManager():
+    WORKERS = 3
+    PRIORITIES = {"High": 2, "Normal": 1, "Low": 0}
+
+    def __init__(self, workers: int = WORKERS) -> None:
+        # Imported here, the GUI imports this module before aiohttp is needed
+        from src.services.http_client import HttpClient
+
+        self.workers = workers
+        self.http_client = HttpClient.get_client()
+        self.job_repository = JobRepository()
+        self.event_bus = EventBus.get_bus()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self._queue = None
+        self._tasks = []
+
+    def start(self) -> None:
+        # Jobs left in the database by the last session are queued again
+        self.http_client.run(self._start())
+
+    async def _start(self) -> None:
+        if self._queue is not None:
+            return
+
+        self._queue = asyncio.PriorityQueue()
+        for job in self.job_repository.get_pending():
+            self._put(job)
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _put(self, job: Job) -> None:
+        if self._queue is None:
+            # Not started yet, start() loads it from the database
+            return
+
+        with self._lock:
+            self._jobs[job.id] = {
+                "id": job.id,
+                "source": job.source,
+                "manga_name": job.manga_name,
+                "priority": job.priority,
+                "status": job.status,
+                "error": job.error,
+            }
+        # Higher priority first, then the order they were queued
+        self._queue.put_nowait((-job.priority, next(self._order), job.id))
+        self.event_bus.publish({"type": "status", "job": job.id, "status": job.status, "error": job.error})
+
+    def _set_status(self, job_id: int, status: str, error: str | None = None) -> None:
+        self.job_repository.set_status(job_id, status, error)
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id]["status"] = status
+                self._jobs[job_id]["error"] = error
+        self.event_bus.publish({"type": "status", "job": job_id, "status": status, "error": error})
+
+    def enqueue(self, source: str, manga_name: str, params: dict, priority: int = 1) -> int:
+        # Safe to call from any thread, the job is persisted before it is queued
+        job = self.job_repository.create(source, manga_name, params, priority)
+        self.http_client.loop.call_soon_threadsafe(self._put, job)
+        return job.id
+
+    def cancel(self, job_id: int) -> bool:
+        job = self.job_repository.get_by_id(job_id)
+        if job is None or job.status != Job.QUEUED:
+            return False
+
+        self._set_status(job_id, Job.CANCELLED)
+        return True
+
+    def get_jobs(self) -> list[dict]:
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: int) -> None:
+        job = self.job_repository.get_by_id(job_id)
+        if job is None or job.status != Job.QUEUED:
+            return
+
+        self._set_status(job_id, Job.RUNNING)
+        try:
+            # Each job has its own service, they only share the HTTP client and its host limits
+            service = get_service(job.source)
+            await service.search_chapters_async(job.manga_name)
+            params = self.job_repository.get_params(job)
+            params["job_id"] = job_id
+            await service.get_files_async(params)
+        except Exception as e:
+            LOGGER.info("Job %s failed", job_id, exc_info=True)
+            self._set_status(job_id, Job.FAILED, str(e))
+            return
+
+        self._set_status(job_id, Job.DONE)
@@ -0,0 +1,114 @@
+import queue
+import time
+
+
+class EventBus():
+    BUS = None
+    MAX_SIZE = 10000
+
+    def __init__(self, max_size: int = MAX_SIZE) -> None:
+        self._queue = queue.Queue(maxsize=max_size)
+
+    @staticmethod
+    def _create_bus():
+        EventBus.BUS = EventBus()
+        return EventBus.BUS
+
+    @staticmethod
+    def get_bus():
+        return EventBus.BUS if EventBus.BUS else EventBus._create_bus()
+
+    def publish(self, event: dict) -> None:
+        # Never blocks a download, when nobody drains the queue the oldest event is dropped
+        event.setdefault("time", time.time())
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def drain(self, max_items: int = 1000) -> list[dict]:
+        events = []
+        while len(events) < max_items:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+
+class ProgressTracker():
+    # Page events are throttled, chapter and job state changes are always published
+    INTERVAL = 0.1
+
+    def __init__(self, job, manga_name: str, chapters_total: int, bus: EventBus | None = None) -> None:
+        self.job = job
+        self.manga_name = manga_name
+        self.chapters_total = chapters_total
+        self.chapters_done = 0
+        self.pages_total = 0
+        self.pages_done = 0
+        self.bytes = 0
+        self.started_at = time.monotonic()
+        self._published_at = 0.0
+        self.bus = bus or EventBus.get_bus()
+
+    def _publish(self, event_type: str, **kwargs) -> None:
+        self.bus.publish({"type": event_type, "job": self.job, "manga": self.manga_name, **kwargs})
+
+    def get_speed(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def get_eta(self) -> float | None:
+        if self.pages_done == 0 or self.pages_total == 0:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return elapsed / self.pages_done * (self.pages_total - self.pages_done)
+
+    def _publish_progress(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._published_at < self.INTERVAL:
+            return
+
+        self._published_at = now
+        self._publish(
+            "progress",
+            chapters_done=self.chapters_done,
+            chapters_total=self.chapters_total,
+            pages_done=self.pages_done,
+            pages_total=self.pages_total,
+            bytes=self.bytes,
+            speed=self.get_speed(),
+            eta=self.get_eta(),
+        )
+
+    def start(self) -> None:
+        self._publish("job", state="started")
+        self._publish_progress(force=True)
+
+    def chapter(self, chapter, state: str) -> None:
+        if state == "done":
+            self.chapters_done += 1
+        self._publish("chapter", chapter=str(chapter), state=state)
+        self._publish_progress(force=state == "done")
+
+    def add_pages(self, count: int) -> None:
+        self.pages_total += count
+        self._publish_progress()
+
+    def page_done(self, size: int) -> None:
+        self.pages_done += 1
+        self.bytes += size
+        self._publish_progress()
+
+    def finish(self, error: Exception | None = None) -> None:
+        self._publish_progress(force=True)
+        if error:
+            self._publish("job", state="failed", error=str(error))
+        else:
+            self._publish("job", state="done")
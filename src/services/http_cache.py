@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from src.services.utils import create_folder, get_cache_folder
+
+
+class HttpCache():
+    MAX_SIZE = 256 * 1024 * 1024
+
+    def __init__(self, folder: str | None = None, max_size: int = MAX_SIZE) -> None:
+        self.folder = create_folder(folder or get_cache_folder())
+        self.max_size = max_size
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _get_paths(self, url: str) -> tuple[str, str]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, f"{key}.json"), os.path.join(self.folder, f"{key}.body")
+
+    def _get_entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for file_name in os.listdir(self.folder):
+            if not file_name.endswith(".json"):
+                continue
+
+            meta_path = os.path.join(self.folder, file_name)
+            body_path = f"{meta_path[:-5]}.body"
+            try:
+                size = os.path.getsize(body_path) + os.path.getsize(meta_path)
+                entries.append((os.path.getmtime(meta_path), size, meta_path))
+            except OSError:
+                continue
+
+        return entries
+
+    def _remove(self, meta_path: str) -> None:
+        for path in (meta_path, f"{meta_path[:-5]}.body"):
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def _evict(self) -> None:
+        # Least recently used first, hits refresh the mtime of the metadata file
+        entries = sorted(self._get_entries())
+        self._size = sum(size for _, size, _ in entries)
+
+        for _, size, meta_path in entries:
+            if self._size <= self.max_size:
+                break
+            self._remove(meta_path)
+            self._size -= size
+
+    def get(self, url: str) -> dict | None:
+        meta_path, body_path = self._get_paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+            with open(body_path, "rb") as file:
+                entry["body"] = file.read()
+        except (OSError, ValueError):
+            return None
+
+        os.utime(meta_path)
+        return entry
+
+    def is_fresh(self, entry: dict, ttl: float) -> bool:
+        return time.time() - entry["stored_at"] < ttl
+
+    def store(self, url: str, body: bytes, etag: str | None, last_modified: str | None) -> None:
+        meta_path, body_path = self._get_paths(url)
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+        }
+
+        with self._lock:
+            with open(f"{body_path}.part", "wb") as file:
+                file.write(body)
+            os.replace(f"{body_path}.part", body_path)
+
+            with open(f"{meta_path}.part", "w", encoding="utf-8") as file:
+                json.dump(entry, file)
+            os.replace(f"{meta_path}.part", meta_path)
+
+            if self._size is None:
+                self._evict()
+            else:
+                self._size += len(body)
+                if self._size > self.max_size:
+                    self._evict()
+
+    def touch(self, url: str) -> None:
+        # A 304 revalidates the stored copy, its TTL starts again
+        meta_path, _ = self._get_paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        entry["stored_at"] = time.time()
+        with self._lock:
+            with open(f"{meta_path}.part", "w", encoding="utf-8") as file:
+                json.dump(entry, file)
+            os.replace(f"{meta_path}.part", meta_path)
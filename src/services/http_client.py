@@ -0,0 +1,385 @@
+import asyncio
+import atexit
+import concurrent.futures
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import aiohttp
+
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from src.services.concurrency import ByteBudget, ConcurrencyController, HostController
+from src.services.http_cache import HttpCache
+from src.services.metrics import Metrics
+from src.services.mirrors import MirrorSelector
+from src.services.retry import RetryPolicy, RetryStats, CircuitBreaker, CircuitOpenError
+from src.services.scheduler import GLOBAL_PAGE_CONCURRENCY
+from src.services.writer import DiskWriter
+
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9,pt-BR;q=0.8",
+}
+
+
+class HttpClient():
+    CLIENT = None
+    LIMIT = 100
+    # Hard ceiling, the per-host controller decides how much of it is used
+    LIMIT_PER_HOST = HostController.MAXIMUM
+    DNS_CACHE_TTL = 300
+    KEEPALIVE_TIMEOUT = 30
+    TIMEOUT = 120
+    CHUNK_SIZE = 64 * 1024
+    # Response bytes held in memory at once by every request of the client
+    MEMORY_BUDGET = 64 * 1024 * 1024
+    # A streamed page only keeps the chunks aiohttp has buffered, not its whole body
+    STREAM_BUFFER = 2 * CHUNK_SIZE
+    # Pages downloading at once over every job and service
+    PAGE_CONCURRENCY = GLOBAL_PAGE_CONCURRENCY
+
+    def __init__(self) -> None:
+        self._session = None
+        self._cache = None
+        self._page_slots = None
+        self.controller = ConcurrencyController()
+        self.retry_policy = RetryPolicy()
+        self.metrics = Metrics.get_metrics()
+        self.stats = RetryStats(self.metrics)
+        self.breakers = {}
+        self.mirrors = MirrorSelector(self)
+        self.budget = ByteBudget(self.MEMORY_BUDGET)
+        self.writer = DiskWriter.get_writer()
+        # Every request runs on this loop, so the pool and its keep-alive
+        # connections outlive a single search or download job
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="http-client", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _create_client():
+        HttpClient.CLIENT = HttpClient()
+        atexit.register(HttpClient.CLIENT.shutdown)
+        return HttpClient.CLIENT
+
+    @staticmethod
+    def get_client():
+        return HttpClient.CLIENT if HttpClient.CLIENT else HttpClient._create_client()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    @property
+    def page_slots(self) -> asyncio.Semaphore:
+        # Created on first use, it belongs to the client loop
+        if self._page_slots is None:
+            self._page_slots = asyncio.Semaphore(self.PAGE_CONCURRENCY)
+        return self._page_slots
+
+    @property
+    def cache(self) -> HttpCache:
+        if self._cache is None:
+            self._cache = HttpCache()
+        return self._cache
+
+    def run(self, coroutine):
+        # Blocking bridge for synchronous callers, must not be called from the client loop itself
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def submit(self, coroutine) -> concurrent.futures.Future:
+        # Non-blocking bridge, the GUI thread must never wait on the network
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.LIMIT,
+                limit_per_host=self.LIMIT_PER_HOST,
+                ttl_dns_cache=self.DNS_CACHE_TTL,
+                keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.TIMEOUT),
+            )
+        return self._session
+
+    @asynccontextmanager
+    async def _request(self, url: str, headers: dict | None = None):
+        # Pages and chapter lists share the host slots of the concurrency controller
+        session = await self.get_session()
+        async with self.controller.slot(url) as slot:
+            async with session.get(url, headers=headers) as resp:
+                slot.set_response(resp.status, resp.headers.get("Retry-After"))
+                yield resp
+
+    def _get_breaker(self, host: str) -> CircuitBreaker:
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(host)
+        return self.breakers[host]
+
+    async def _retry(self, url: str, request):
+        # `request` makes a new attempt each time it is called
+        host = urlsplit(url).netloc
+        breaker = self._get_breaker(host)
+        attempt = 0
+
+        while True:
+            try:
+                probe = breaker.check()
+            except CircuitOpenError:
+                self.stats.record_rejected(host)
+                raise
+
+            started = time.monotonic()
+            try:
+                result = await request()
+            except asyncio.CancelledError:
+                if probe:
+                    breaker.release()
+                raise
+            except Exception as error:
+                self.stats.record(host, time.monotonic() - started)
+                if not self.retry_policy.is_retryable(error):
+                    if probe:
+                        breaker.release()
+                    raise
+
+                self.stats.record_failure(host)
+                breaker.record_failure()
+                attempt += 1
+                if attempt >= self.retry_policy.attempts:
+                    raise
+
+                self.stats.record_retry(host)
+                await asyncio.sleep(self.retry_policy.get_delay(attempt - 1))
+                continue
+
+            self.stats.record(host, time.monotonic() - started)
+            breaker.record_success()
+            return result
+
+    def get_stats(self) -> dict:
+        return self.stats.to_dict()
+
+    async def _read(self, resp: aiohttp.ClientResponse) -> bytes:
+        # The whole body ends up in memory, its size is taken from the budget before reading it
+        if resp.content_length is not None:
+            async with self.budget.reserve(resp.content_length):
+                return await resp.read()
+
+        # No Content-Length, a bounded share is taken up front and only grows while
+        # nobody waits for the budget. Past that the body goes to a temporary file
+        # and its share is given back, a reader never waits holding part of it.
+        chunks = []
+        size = 0
+        spool = None
+        reserved = await self.budget.acquire(self.STREAM_BUFFER)
+        try:
+            async for chunk in resp.content.iter_chunked(self.CHUNK_SIZE):
+                size += len(chunk)
+                if spool is None and size > reserved:
+                    if self.budget.try_acquire(size - reserved):
+                        reserved = size
+                    else:
+                        spool = await asyncio.to_thread(tempfile.TemporaryFile)
+                        chunks.append(chunk)
+                        await self.writer.run(spool.writelines, chunks)
+                        chunks = []
+                        await self.budget.release(reserved)
+                        reserved = 0
+                        continue
+
+                if spool is None:
+                    chunks.append(chunk)
+                else:
+                    await self.writer.run(spool.write, chunk)
+
+            if spool is None:
+                return b"".join(chunks)
+
+            async with self.budget.reserve(size):
+                return await self.writer.run(self._read_spool, spool)
+        finally:
+            await asyncio.shield(self.budget.release(reserved))
+            if spool is not None:
+                spool.close()
+
+    def _read_spool(self, spool) -> bytes:
+        spool.seek(0)
+        return spool.read()
+
+    async def probe(self, url: str, size: int) -> dict:
+        # One attempt at the first `size` bytes, used to rank the mirrors of an image host
+        started_at = time.monotonic()
+        async with self._request(url, {"Range": f"bytes=0-{size - 1}"}) as resp:
+            resp.raise_for_status()
+            latency = time.monotonic() - started_at
+            received = 0
+            async with self.budget.reserve(min(size, self.STREAM_BUFFER)):
+                async for chunk in resp.content.iter_chunked(self.CHUNK_SIZE):
+                    received += len(chunk)
+                    if received >= size:
+                        break
+
+        return {"latency": latency, "size": received, "seconds": time.monotonic() - started_at}
+
+    async def get(self, url: str) -> bytes:
+        return await self._retry(url, lambda: self._get(url))
+
+    async def _get(self, url: str) -> bytes:
+        async with self._request(url) as resp:
+            resp.raise_for_status()
+            return await self._read(resp)
+
+    async def get_cached(self, url: str, ttl: float) -> bytes:
+        return await self._retry(url, lambda: self._get_cached(url, ttl))
+
+    async def _get_cached(self, url: str, ttl: float) -> bytes:
+        # Fresh entries are served without a request, stale ones are revalidated
+        # with If-None-Match/If-Modified-Since and a 304 reuses the stored body
+        entry = await asyncio.to_thread(self.cache.get, url)
+        if entry and self.cache.is_fresh(entry, ttl):
+            return entry["body"]
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        async with self._request(url, headers) as resp:
+            if resp.status == 304 and entry:
+                await asyncio.to_thread(self.cache.touch, url)
+                return entry["body"]
+
+            resp.raise_for_status()
+            content = await self._read(resp)
+
+            await asyncio.to_thread(
+                self.cache.store,
+                url,
+                content,
+                resp.headers.get("ETag"),
+                resp.headers.get("Last-Modified")
+            )
+            return content
+
+    async def get_text(self, url: str, ttl: float | None = None, stage: str = "html") -> str:
+        with self.metrics.timer(stage, url):
+            content = await self.get(url) if ttl is None else await self.get_cached(url, ttl)
+        return content.decode("utf-8")
+
+    def _hash_file(self, path: str):
+        md5_hash = hashlib.md5()
+        size = 0
+        with open(path, "rb") as file:
+            while chunk := file.read(self.CHUNK_SIZE):
+                md5_hash.update(chunk)
+                size += len(chunk)
+        return md5_hash, size
+
+    def _is_resumed(self, resp: aiohttp.ClientResponse, offset: int) -> bool:
+        content_range = resp.headers.get("Content-Range", "")
+        return resp.status == 206 and content_range.startswith(f"bytes {offset}-")
+
+    async def download(self, url: str, save_path: str) -> dict:
+        # A failed attempt leaves its .part file behind, the next one continues it
+        try:
+            with self.metrics.timer("image", url):
+                result = await self._retry(url, lambda: self._download(url, save_path))
+        except Exception:
+            self.mirrors.record_failure(url)
+            raise
+
+        self.metrics.increment("bytes", "image", url, result["size"])
+        return result
+
+    async def _download(self, url: str, save_path: str) -> dict:
+        # Streams the body into a temporary file while hashing it, the page only
+        # shows up under its final name once it is complete. A .part file left by
+        # an interrupted run is continued with a Range request.
+        temp_path = f"{save_path}.part"
+        offset = os.path.getsize(temp_path) if os.path.isfile(temp_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        started_at = time.monotonic()
+
+        async with self._request(url, headers) as resp:
+            restart = resp.status == 416
+            if not restart:
+                resp.raise_for_status()
+                latency = time.monotonic() - started_at
+                result = await self._write_body(resp, url, temp_path, offset)
+                self.mirrors.record(url, latency, result["received"], time.monotonic() - started_at)
+
+        if restart:
+            # The partial file no longer matches the remote one
+            os.remove(temp_path)
+            return await self._download(url, save_path)
+
+        await self.writer.replace(temp_path, save_path)
+        return result
+
+    async def _write_body(self, resp: aiohttp.ClientResponse, url: str, temp_path: str, offset: int) -> dict:
+        if offset and self._is_resumed(resp, offset):
+            md5_hash, size = await asyncio.to_thread(self._hash_file, temp_path)
+            mode = "ab"
+        else:
+            md5_hash, size = hashlib.md5(), 0
+            mode = "wb"
+        received = 0
+        md5_time = 0.0
+        write_time = 0.0
+        buffer = self.STREAM_BUFFER if resp.content_length is None else min(resp.content_length, self.STREAM_BUFFER)
+
+        # Chunks are handed to the writer pool, the next one is read while the last is written
+        async with self.budget.reserve(buffer), self.writer.open(temp_path, mode) as file:
+            async for chunk in resp.content.iter_chunked(self.CHUNK_SIZE):
+                started_at = time.perf_counter()
+                md5_hash.update(chunk)
+                md5_time += time.perf_counter() - started_at
+
+                received += len(chunk)
+
+                started_at = time.perf_counter()
+                await file.write(chunk)
+                write_time += time.perf_counter() - started_at
+
+        self.metrics.observe("md5", url, md5_time)
+        self.metrics.observe("disk_write", url, write_time)
+
+        # Content-Length is the encoded size when the body comes compressed
+        expected = None if resp.headers.get("Content-Encoding") else resp.content_length
+        if expected is not None and expected != received:
+            os.remove(temp_path)
+            raise aiohttp.ClientPayloadError(f"Incomplete download, expected {expected} bytes and got {received}.\n{url}")
+
+        return {"size": size + received, "md5": md5_hash.hexdigest(), "received": received}
+
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _stop(self) -> None:
+        # Background work (download manager workers, prefetches) ends with the client
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.close()
+
+    def shutdown(self) -> None:
+        if not self._loop.is_running():
+            return
+
+        try:
+            self.run(self._stop())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
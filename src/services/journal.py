@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+import threading
+
+
+PENDING = "pending"
+PARTIAL = "partial"
+DONE = "done"
+
+
+class ChapterJournal():
+    FILE_NAME = ".journal.json"
+
+    def __init__(self, folder: str) -> None:
+        self.folder = folder
+        self.path = os.path.join(folder, self.FILE_NAME)
+        self.pages = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    async def open(folder: str) -> "ChapterJournal":
+        journal = ChapterJournal(folder)
+        await asyncio.to_thread(journal._load)
+        return journal
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                self.pages = json.load(file)
+        except (OSError, ValueError):
+            self.pages = {}
+
+    def _save(self) -> None:
+        with self._lock:
+            content = json.dumps(self.pages)
+            with open(f"{self.path}.part", "w", encoding="utf-8") as file:
+                file.write(content)
+            os.replace(f"{self.path}.part", self.path)
+
+    async def save(self) -> None:
+        await asyncio.to_thread(self._save)
+
+    def is_done(self, save_path: str) -> bool:
+        if not os.path.isfile(save_path):
+            return False
+
+        # Pages saved before the journal existed were renamed into place only when complete
+        page = self.pages.get(os.path.basename(save_path))
+        if page is None or page["state"] != DONE:
+            return page is None
+
+        return page.get("size") is None or os.path.getsize(save_path) == page["size"]
+
+    def set_state(self, save_path: str, url: str, state: str, **kwargs) -> None:
+        self.pages[os.path.basename(save_path)] = {"url": url, "state": state, **kwargs}
+
+    async def download(self, http_client, url: str, save_path: str) -> bool:
+        # Returns False when the page was already complete on disk
+        if self.is_done(save_path):
+            return False
+
+        try:
+            result = await http_client.download(url, save_path)
+        except BaseException:
+            temp_path = f"{save_path}.part"
+            offset = os.path.getsize(temp_path) if os.path.isfile(temp_path) else 0
+            self.set_state(save_path, url, PARTIAL if offset else PENDING, offset=offset)
+            await asyncio.shield(self.save())
+            raise
+
+        self.set_state(save_path, url, DONE, offset=result["size"], size=result["size"], md5=result["md5"])
+        await self.save()
+        return True
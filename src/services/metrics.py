@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds, from a regex over a small page up to a slow chapter
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def get_host(url: str) -> str:
+    return urlsplit(url).netloc if "://" in url else url
+
+
+class Histogram():
+
+    def __init__(self, buckets: tuple = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+                break
+
+    def get_cumulative(self) -> list[int]:
+        result = []
+        total = 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "buckets": dict(zip([str(bucket) for bucket in self.buckets], self.get_cumulative())),
+        }
+
+
+class Metrics():
+    METRICS = None
+    PREFIX = "getmymanga"
+
+    def __init__(self) -> None:
+        # Stages are recorded from the client loop and from the archive and file threads
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.json_file = None
+        self.textfile = None
+
+    @staticmethod
+    def _create_metrics():
+        Metrics.METRICS = Metrics()
+        return Metrics.METRICS
+
+    @staticmethod
+    def get_metrics():
+        return Metrics.METRICS if Metrics.METRICS else Metrics._create_metrics()
+
+    def observe(self, stage: str, host: str, seconds: float) -> None:
+        key = (stage, get_host(host))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(seconds)
+
+    def increment(self, name: str, stage: str, host: str, value: float = 1) -> None:
+        key = (name, stage, get_host(host))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, stage: str, host: str = ""):
+        # `host` may be the full URL, only its host is kept as a label
+        started_at = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment("errors", stage, host)
+            raise
+        finally:
+            self.observe(stage, host, time.perf_counter() - started_at)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            stages = {}
+            for (stage, host), histogram in sorted(self.histograms.items()):
+                stages.setdefault(stage, {})[host] = histogram.to_dict()
+
+            counters = {}
+            for (name, stage, host), value in sorted(self.counters.items()):
+                counters.setdefault(name, {}).setdefault(stage, {})[host] = value
+
+            gauges = dict(sorted(self.gauges.items()))
+
+        return {"stages": stages, "counters": counters, "gauges": gauges}
+
+    def to_prometheus(self) -> str:
+        lines = []
+        name = f"{self.PREFIX}_stage_seconds"
+
+        with self._lock:
+            lines.append(f"# HELP {name} Time spent on each download stage.")
+            lines.append(f"# TYPE {name} histogram")
+            for (stage, host), histogram in sorted(self.histograms.items()):
+                labels = f'stage="{stage}",host="{host}"'
+                for bucket, count in zip(histogram.buckets, histogram.get_cumulative()):
+                    lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            for counter in sorted({key[0] for key in self.counters}):
+                counter_name = f"{self.PREFIX}_{counter}_total"
+                lines.append(f"# TYPE {counter_name} counter")
+                for (key, stage, host), value in sorted(self.counters.items()):
+                    if key == counter:
+                        lines.append(f'{counter_name}{{stage="{stage}",host="{host}"}} {value}')
+
+            for gauge, value in sorted(self.gauges.items()):
+                gauge_name = f"{self.PREFIX}_{gauge}"
+                lines.append(f"# TYPE {gauge_name} gauge")
+                lines.append(f"{gauge_name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def _write(self, path: str, content: str) -> None:
+        # node_exporter may read the file at any time, it is replaced in one step
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temp_path, path)
+
+    def dump(self) -> dict:
+        # Called at the end of each job, the numbers add up over the whole session
+        result = self.to_dict()
+        LOGGER.info("Metrics: %s", json.dumps(result))
+
+        if self.json_file:
+            self._write(self.json_file, json.dumps(result, indent=2))
+
+        if self.textfile:
+            self._write(self.textfile, self.to_prometheus())
+
+        return result
@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+import aiohttp
+
+from urllib.parse import urlsplit, urlunsplit
+
+from src.services.retry import CircuitOpenError
+
+
+# Errors that send a page to the next mirror once the retries are spent
+FAILOVER_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError)
+
+
+def get_host(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+def replace_host(url: str, host: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, host, parts.path, parts.query, parts.fragment))
+
+
+class HostScore():
+    # Exponentially weighted, the latest transfers count the most
+    ALPHA = 0.3
+    # Consecutive failures before the host is left out of the ranking
+    MAX_FAILURES = 3
+    COOLDOWN = 60.0
+
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self.latency = None
+        self.throughput = None
+        self.failures = 0
+        self.failed_at = 0.0
+        self.probed_at = 0.0
+
+    def _average(self, current: float | None, value: float) -> float:
+        return value if current is None else current + self.ALPHA * (value - current)
+
+    def record(self, latency: float, size: int, seconds: float) -> None:
+        self.latency = self._average(self.latency, latency)
+        # Transfers too small or too fast to tell the throughput only count for latency
+        if size and seconds > latency:
+            self.throughput = self._average(self.throughput, size / (seconds - latency))
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.failed_at = time.monotonic()
+
+    def is_healthy(self) -> bool:
+        return self.failures < self.MAX_FAILURES or time.monotonic() - self.failed_at > self.COOLDOWN
+
+    def get_cost(self, size: int) -> float:
+        # Expected seconds to fetch `size` bytes, hosts never measured go last
+        if self.latency is None:
+            return float("inf")
+        return self.latency + (size / self.throughput if self.throughput else 0)
+
+    def to_dict(self) -> dict:
+        return {
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "throughput": round(self.throughput) if self.throughput else None,
+            "failures": self.failures,
+        }
+
+
+class MirrorSelector():
+    # Image hosts serving the same paths are a group, every page URL is sent to
+    # the cheapest healthy host of its group. Hosts are probed once per group,
+    # then ranked by the transfers of the job itself so a host that degrades
+    # mid-job loses its pages to the next one.
+    PROBE_SIZE = 64 * 1024
+    PROBE_TIMEOUT = 5.0
+    # Seconds before a group is probed again
+    PROBE_TTL = 10 * 60
+    # Bytes of a typical page, weights latency against throughput
+    PAGE_SIZE = 300 * 1024
+
+    def __init__(self, http_client) -> None:
+        self.http_client = http_client
+        self.hosts = {}
+        self.groups = {}
+        self._probes = {}
+
+    def _get_score(self, host: str) -> HostScore:
+        if host not in self.hosts:
+            self.hosts[host] = HostScore(host)
+        return self.hosts[host]
+
+    def add_group(self, hosts: list[str]) -> list[str]:
+        # Hosts already in a group join it, the scraped host is always part of it
+        group = []
+        for host in hosts:
+            for member in self.groups.get(host, [host]):
+                if member not in group:
+                    group.append(member)
+
+        for host in group:
+            self.groups[host] = group
+        return group
+
+    def _is_healthy(self, host: str) -> bool:
+        breaker = self.http_client.breakers.get(host)
+        # A half-open host takes one request at a time until its probe tells how it is
+        if breaker is not None and (breaker.state == breaker.OPEN or breaker.probing):
+            return False
+        return self._get_score(host).is_healthy()
+
+    def get_hosts(self, url: str) -> list[str]:
+        # Best first, unhealthy hosts are kept at the end as the last resort
+        host = get_host(url)
+        group = self.groups.get(host, [host])
+        healthy = [member for member in group if self._is_healthy(member)]
+        ranked = sorted(healthy, key=lambda member: (self._get_score(member).get_cost(self.PAGE_SIZE), member != host))
+        return ranked + [member for member in group if member not in healthy]
+
+    def get_urls(self, url: str) -> list[str]:
+        return [replace_host(url, host) for host in self.get_hosts(url)]
+
+    def record(self, url: str, latency: float, size: int, seconds: float) -> None:
+        self._get_score(get_host(url)).record(latency, size, seconds)
+
+    def record_failure(self, url: str) -> None:
+        self._get_score(get_host(url)).record_failure()
+
+    async def _probe_host(self, url: str) -> None:
+        try:
+            result = await asyncio.wait_for(self.http_client.probe(url, self.PROBE_SIZE), self.PROBE_TIMEOUT)
+        except Exception:
+            self.record_failure(url)
+            return
+
+        self.record(url, result["latency"], result["size"], result["seconds"])
+
+    async def _probe(self, url: str, group: list[str]) -> None:
+        await asyncio.gather(*[self._probe_host(replace_host(url, host)) for host in group])
+        for host in group:
+            self._get_score(host).probed_at = time.monotonic()
+
+    async def probe(self, url: str, mirrors: list[str]) -> None:
+        # `url` is a page every mirror should have, concurrent chapters share one probe
+        group = self.add_group([get_host(url), *mirrors])
+        if len(group) < 2:
+            return
+
+        key = group[0]
+        probed_at = min(self._get_score(host).probed_at for host in group)
+        if key not in self._probes or (self._probes[key].done() and time.monotonic() - probed_at > self.PROBE_TTL):
+            self._probes[key] = asyncio.ensure_future(self._probe(url, group))
+
+        await asyncio.shield(self._probes[key])
+
+    def to_dict(self) -> dict:
+        return {host: score.to_dict() for host, score in self.hosts.items()}
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import zipfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.metrics import Metrics
+
+
+class ChapterArchive():
+    EXTENSION = ".cbr"
+
+    def __init__(self, folder_path: str) -> None:
+        self.folder_path = folder_path
+        self.archive_path = f"{folder_path}{self.EXTENSION}"
+        self._temp_path = f"{self.archive_path}.part"
+        self._names = set()
+        # Page order of the chapter, a page that lands early waits for the ones before it
+        self._pages = []
+        self._next = 0
+        self._arrived = set()
+        self._zip = None
+        # ZipFile is not thread-safe, a single thread keeps the appends in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+        self.metrics = Metrics.get_metrics()
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _write(self, name: str) -> None:
+        if self._zip is None:
+            self._zip = zipfile.ZipFile(self._temp_path, "w", zipfile.ZIP_STORED)
+
+        if name in self._names:
+            return
+
+        # Pages are already compressed images, they are stored as they are
+        with self.metrics.timer("cbr_write"):
+            self._zip.write(os.path.join(self.folder_path, name), name)
+        self._names.add(name)
+
+    def _flush(self) -> None:
+        while self._next < len(self._pages) and self._pages[self._next] in self._arrived:
+            self._write(self._pages[self._next])
+            self._next += 1
+
+    def _set_pages(self, file_names: list[str]) -> None:
+        self._pages = [os.path.normpath(file_name) for file_name in file_names]
+        self._next = 0
+        self._flush()
+
+    def _add(self, file_path: str) -> None:
+        name = os.path.relpath(file_path, self.folder_path)
+        if name not in self._pages:
+            self._write(name)
+            return
+
+        self._arrived.add(name)
+        self._flush()
+
+    def _close(self) -> None:
+        # The pages of the list first, in its order, then anything else in the folder by name
+        for name in self._pages[self._next:]:
+            if os.path.isfile(os.path.join(self.folder_path, name)):
+                self._write(name)
+
+        for file_name in sorted(os.listdir(self.folder_path)):
+            file_path = os.path.join(self.folder_path, file_name)
+            if os.path.isfile(file_path) and not file_name.startswith(".") and not file_name.endswith(".part"):
+                self._write(file_name)
+
+        if self._zip is None:
+            return
+
+        with self.metrics.timer("cbr"):
+            self._zip.close()
+            os.replace(self._temp_path, self.archive_path)
+
+    def _abort(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+
+        if os.path.isfile(self._temp_path):
+            os.remove(self._temp_path)
+
+    async def set_pages(self, file_names: list[str]) -> None:
+        await self._run(self._set_pages, file_names)
+
+    async def add(self, file_path: str) -> None:
+        await self._run(self._add, file_path)
+
+    async def close(self) -> None:
+        # Picks up the pages that were already on disk before the download started
+        try:
+            await self._run(self._close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def abort(self) -> None:
+        try:
+            await self._run(self._abort)
+        finally:
+            self._executor.shutdown(wait=False)
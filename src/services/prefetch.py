@@ -0,0 +1,78 @@
+import asyncio
+import concurrent.futures
+import logging
+
+from src.repositories.manga import MangaRepository
+from src.services.utils import get_service
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Prefetcher():
+    # Searches a title in the background before it is asked for, the chapter
+    # list lands in the stored index and the next page lists in the chapter
+    # manifests, so the real search and the download skip their HTML. Its services are its own, a prefetch never
+    # changes the manga the GUI service is working on.
+    # Chapters after the last downloaded one whose page lists are fetched too
+    CHAPTERS = 3
+
+    def __init__(self, chapters: int = CHAPTERS) -> None:
+        self.chapters = chapters
+        self.services = {}
+        self.searches = {}
+        self.manga_repository = MangaRepository()
+        self._lock = None
+
+    def _get_service(self, source: str):
+        if source not in self.services:
+            self.services[source] = get_service(source)
+        return self.services[source]
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def prefetch(self, source: str, manga_name: str) -> concurrent.futures.Future:
+        # Called from any thread, the work runs on the HTTP client loop
+        service = self._get_service(source)
+        return service.http_client.submit(self._prefetch(service, source, manga_name))
+
+    async def _prefetch(self, service, source: str, manga_name: str) -> None:
+        key = (source, manga_name)
+        if key in self.searches and not self.searches[key].done():
+            return
+
+        # One title at a time, they share the services and stay out of the way of the downloads
+        async with self._get_lock():
+            manga = self.manga_repository.get_by_name(manga_name)
+            last_downloaded = manga.last_downloaded if manga else 0
+            last_directory = manga.last_directory if manga else 1
+
+            self.searches[key] = asyncio.ensure_future(service.search_chapters_async(manga_name))
+            try:
+                await self.searches[key]
+                if manga and self.chapters:
+                    await self._prefetch_pages(service, last_directory, last_downloaded + 1)
+            except Exception:
+                LOGGER.info("Prefetch of %s from %s failed", manga_name, source, exc_info=True)
+
+    async def _prefetch_pages(self, service, directory: int, start_at: int) -> None:
+        # Stored like a download stores them, the download then only fetches the images
+        directory_dict = service._get_directory(directory)
+        for chapter_detail in service._get_target_chapters(directory_dict, start_at, start_at + self.chapters - 1):
+            for job in service._get_chapter_jobs(directory, chapter_detail):
+                chapter = service._get_chapter_row(job)
+                if chapter is not None and service.chapter_repository.get_pages(chapter):
+                    continue
+
+                items = await service._get_page_items(job, service.PAGE_CACHE_TTL)
+                if chapter is not None and items:
+                    service.chapter_repository.save_pages(chapter, items)
+
+    async def wait(self, source: str, manga_name: str) -> None:
+        # A search for a title being prefetched waits for it instead of scraping the list again
+        search = self.searches.get((source, manga_name))
+        if search is not None and not search.done():
+            await asyncio.wait([search])
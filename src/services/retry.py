@@ -0,0 +1,134 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from src.services.metrics import Metrics
+
+RETRY_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RetryPolicy():
+
+    def __init__(
+        self,
+        attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        jitter: float = 0.5,
+        retry_status: tuple = RETRY_STATUS
+    ) -> None:
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_status = retry_status
+
+    def is_retryable(self, error: BaseException) -> bool:
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.retry_status
+
+        return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
+
+    def get_delay(self, attempt: int) -> float:
+        # Exponential backoff, `jitter` is the fraction of the delay that is randomized
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+
+class CircuitBreaker():
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, host: str, failure_threshold: int = 8, reset_timeout: float = 30.0) -> None:
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def check(self) -> bool:
+        # True when the caller is the one request probing a half-open host
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Too many failures on {self.host}, waiting before trying again.")
+            self.state = self.HALF_OPEN
+            self.probing = False
+
+        if self.state == self.HALF_OPEN:
+            if self.probing:
+                raise CircuitOpenError(f"Too many failures on {self.host}, a request is testing it.")
+            self.probing = True
+            return True
+        return False
+
+    def release(self) -> None:
+        # The probe ended without telling whether the host is healthy, the next request probes it
+        self.probing = False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class RetryStats():
+    # Kept per host for the logs, and fed to the metrics so the dumps carry them too
+
+    def __init__(self, metrics: Metrics | None = None) -> None:
+        self.hosts = {}
+        self.metrics = metrics or Metrics.get_metrics()
+
+    def _get_host(self, host: str) -> dict:
+        if host not in self.hosts:
+            self.hosts[host] = {
+                "requests": 0,
+                "retries": 0,
+                "failures": 0,
+                "rejected": 0,
+                "latency_total": 0.0,
+                "latency_max": 0.0,
+            }
+        return self.hosts[host]
+
+    def record(self, host: str, latency: float) -> None:
+        stats = self._get_host(host)
+        stats["requests"] += 1
+        stats["latency_total"] += latency
+        stats["latency_max"] = max(stats["latency_max"], latency)
+        self.metrics.increment("requests", "http", host)
+        self.metrics.observe("request", host, latency)
+
+    def record_retry(self, host: str) -> None:
+        self._get_host(host)["retries"] += 1
+        self.metrics.increment("retries", "http", host)
+
+    def record_failure(self, host: str) -> None:
+        self._get_host(host)["failures"] += 1
+        self.metrics.increment("failures", "http", host)
+
+    def record_rejected(self, host: str) -> None:
+        self._get_host(host)["rejected"] += 1
+        self.metrics.increment("rejected", "http", host)
+
+    def to_dict(self) -> dict:
+        result = {}
+        for host, stats in self.hosts.items():
+            result[host] = dict(stats)
+            result[host]["latency_avg"] = stats["latency_total"] / stats["requests"] if stats["requests"] else 0.0
+        return result
@@ -0,0 +1,79 @@
+import asyncio
+import typing
+
+from contextlib import nullcontext
+
+
+CHAPTER_CONCURRENCY = 5
+PAGE_CONCURRENCY = 8
+GLOBAL_PAGE_CONCURRENCY = 64
+
+
+class Scheduler():
+
+    def __init__(
+        self,
+        limit: int = CHAPTER_CONCURRENCY,
+        page_limit: int = PAGE_CONCURRENCY,
+        page_slots: asyncio.Semaphore | None = None
+    ) -> None:
+        self.limit = max(1, limit)
+        self.page_limit = max(1, page_limit)
+        # The HTTP client passes its own so the page bound holds across jobs
+        self.page_slots = page_slots or asyncio.Semaphore(GLOBAL_PAGE_CONCURRENCY)
+
+    async def _worker(self, queue: asyncio.Queue, results: list, slots: asyncio.Semaphore | None) -> None:
+        while True:
+            index, coroutine = await queue.get()
+            try:
+                async with slots or nullcontext():
+                    results[index] = await coroutine
+            finally:
+                # Cancelled while waiting for a slot, it never started
+                coroutine.close()
+                queue.task_done()
+
+    async def run(
+        self,
+        coroutines: typing.Iterable[typing.Awaitable],
+        limit: int | None = None,
+        slots: asyncio.Semaphore | None = None
+    ) -> list:
+        # Keep `limit` coroutines in flight, a new one starts as soon as any finishes
+        coroutines = list(coroutines)
+        results = [None] * len(coroutines)
+
+        if len(coroutines) == 0:
+            return results
+
+        queue = asyncio.Queue()
+        for item in enumerate(coroutines):
+            queue.put_nowait(item)
+
+        workers_count = min(limit or self.limit, len(coroutines))
+        workers = [asyncio.create_task(self._worker(queue, results, slots)) for _ in range(workers_count)]
+
+        joined = asyncio.create_task(queue.join())
+
+        try:
+            done, _ = await asyncio.wait([joined, *workers], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not joined and task.exception():
+                    raise task.exception()
+        finally:
+            joined.cancel()
+            for worker in workers:
+                worker.cancel()
+
+            # Close coroutines that never started so they don't warn as "never awaited"
+            while not queue.empty():
+                _, coroutine = queue.get_nowait()
+                coroutine.close()
+
+            await asyncio.gather(joined, *workers, return_exceptions=True)
+
+        return results
+
+    async def run_pages(self, coroutines: typing.Iterable[typing.Awaitable]) -> list:
+        # Pages of one chapter are bound by `page_limit`, every chapter of the job shares the global slots
+        return await self.run(coroutines, self.page_limit, self.page_slots)
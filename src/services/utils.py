@@ -1,8 +1,6 @@
+import importlib
 import os
 import platform
-import zipfile
-import subprocess
-import hashlib
 
 
 def remove_leading_zeros(num: str) -> str:
@@ -27,6 +25,16 @@ def get_default_download_folder() -> str:
         return ""
 
 
+def get_cache_folder() -> str:
+    system = platform.system()
+    if system == "Windows":
+        return os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "getmymanga", "cache")
+    elif system == "Darwin":  # macOS
+        return os.path.join(os.path.expanduser("~"), "Library", "Caches", "getmymanga")
+    else:
+        return os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "getmymanga")
+
+
 def create_folder(folder_path) -> str:
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
@@ -74,27 +82,22 @@ def remove_files(folder):
     os.rmdir(folder)
 
 
-def create_cbr(folder_path):
-    if not os.path.exists(folder_path):
-        return
-
-    if "Windows" == platform.system():
-        with zipfile.ZipFile(f"{folder_path}.cbr", 'w', zipfile.ZIP_DEFLATED) as cbr_file:
-            for folder_name, subfolders, files in os.walk(folder_path):
-                for filename in files:
-                    file_path = os.path.join(folder_name, filename)
-                    cbr_file.write(str(file_path), str(os.path.relpath(str(file_path), str(folder_path))))
-    else:
-        subprocess.run(["zip", "-r", f"{folder_path}.cbr", folder_path])
-    # shutil.rmtree(folder_path)
+# Source name: (module, class), a service module and its HTTP stack are only
+# imported the first time the source is used
+SOURCES = {
+    "WeebCentral": ("src.services.wcentral_service", "WeebCentralService"),
+    "Mangaonline": ("src.services.mangaonline_service", "MangaOnlineService"),
+    "Mangasee123": ("src.services.mangasee_service", "MangaseeService"),
+}
 
 
+def get_sources():
+    return list(SOURCES)
 
-async def calculate_md5(content):
-    md5_hash = hashlib.md5()
-    md5_hash.update(content)
-    return md5_hash.hexdigest()
 
+def get_service(source: str):
+    for name, (module_name, class_name) in SOURCES.items():
+        if name.lower() == source.lower():
+            return getattr(importlib.import_module(module_name), class_name)()
 
-def get_sources():
-    return ["WeebCentral", "Mangaonline", "Mangasee123"]
\ No newline at end of file
+    raise Exception(f"Unknown source {source}, use one of: {', '.join(get_sources())}.")
\ No newline at end of file
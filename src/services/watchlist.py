@@ -0,0 +1,66 @@
+import logging
+
+from src.models.subscription import Subscription
+from src.repositories.subscription import SubscriptionRepository
+from src.services.scheduler import Scheduler
+from src.services.utils import get_service
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Watchlist():
+    CONCURRENCY = 32
+
+    def __init__(self, concurrency: int = CONCURRENCY) -> None:
+        self.concurrency = concurrency
+        self.subscription_repository = SubscriptionRepository()
+
+    def _get_last_chapter(self, manga_dict: dict, directory: int) -> int:
+        return manga_dict["directories"][directory]["last_chapter"]
+
+    async def check(self, subscription: Subscription, download: bool = True) -> dict:
+        name = subscription.manga.name
+        last_downloaded = subscription.manga.last_downloaded
+
+        service = get_service(subscription.source)
+        manga_dict = await service.search_chapters_async(name, refresh=True)
+        last_chapter = self._get_last_chapter(manga_dict, subscription.directory)
+
+        result = {
+            "source": subscription.source,
+            "manga": name,
+            "status": "ok",
+            "last_downloaded": last_downloaded,
+            "last_chapter": last_chapter,
+            "new_chapters": max(0, last_chapter - last_downloaded),
+        }
+
+        if download and last_chapter > last_downloaded:
+            files = await service.get_files_async({
+                "output": subscription.output,
+                "directory_option": subscription.directory,
+                "download_option": "Range",
+                "start_at": last_downloaded + 1,
+                "end_at": last_chapter,
+                "cbr": subscription.cbr,
+            })
+            result["output"] = files["output"]
+            result["chapters"] = files["chapters"]
+
+        self.subscription_repository.set_checked(subscription)
+        return result
+
+    async def _check(self, subscription: Subscription, download: bool) -> dict:
+        # One broken title must not stop the rest of the watchlist
+        try:
+            return await self.check(subscription, download)
+        except Exception as e:
+            LOGGER.info("%s failed", subscription.manga.name, exc_info=True)
+            return {"source": subscription.source, "manga": subscription.manga.name, "status": "error", "error": str(e)}
+
+    async def run(self, download: bool = True) -> list[dict]:
+        subscriptions = self.subscription_repository.get_enabled()
+        return await Scheduler(self.concurrency).run(
+            [self._check(subscription, download) for subscription in subscriptions]
+        )
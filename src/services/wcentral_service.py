@@ -1,210 +1,104 @@
-import asyncio
-import os
-import aiofiles
-import json
-import requests_html
 import re
 
 from typing import List
 
-from src.repositories.manga import MangaRepository
-from src.services.utils import (remove_leading_zeros,
-                                get_default_download_folder,
-                                create_folder,
-                                create_cbr,
-                                add_leading_zeros,
-                                calculate_md5)
+from src.services.base_service import BaseService
+from src.services.utils import add_leading_zeros
 
 
-async def chunk_routines(coroutines):
-    if len(coroutines) > 10:
-        for chunk in [coroutines[i:i + 10] for i in range(0, len(coroutines), 10)]:
-            await asyncio.gather(*chunk)
-    else:
-        await asyncio.gather(*coroutines)
+CHAPTER_LINK_PATTERN = re.compile(r'<a href="(.*?)"')
+IMAGE_PATTERN = re.compile(r'src="(https?://.*?)"')
 
 
-class WeebCentralService:
-    HOST = "https://weebcentral.com"
-
-    def __init__(self):
-        self.compress_to_cbr = False
-        self.manga_name = None
-        self.manga_dict = {}
-        self.manga_repository = MangaRepository()
-
-    def _set_manga_dict(self, name: str):
-        self.manga_repository.create(name)
-        self.manga_dict[self.manga_name] = {
-            "name": name,
-            "directories": {},
-            "chapters_count": 0
-        }
-
-    def _get_manga_dict(self,) -> dict | None:
-        return self.manga_dict[self.manga_name] if self.manga_name in self.manga_dict else None
-
-    def _get_directories_count(self,) -> int:
-        return len(self._get_manga_dict()["directories"])
-
-    def _get_manga_url(self) -> str:
-        return f"{self.HOST}/series/{self.manga_name}/full-chapter-list"
-
-    def _get_manga_chapter_url(self, chapter_url: str) -> str:
-        chapter_code = chapter_url.split("/")[-1]
-        return f"{self.HOST}/chapters/{chapter_code}/images?is_prev=False&current_page=1&reading_style=long_strip"
-
-    async def _get_items(
-        self,
-        session,
-        params: dict
-    ) -> list:
-        items = []
-
-        url = self._get_manga_chapter_url(params['chapter_url'])
-        resp = await session.request(method='GET', url=url)
-        content = resp.content.decode('utf-8')
-
-        pattern = re.compile(r'src="https://(.*?)"')
-        chapter_pages = pattern.findall(content)
-
-        for page in chapter_pages:
-            items.append({"download_url": f'https://{page}'})
-
-        return items
-
-    async def _download_and_save_files(self, params: dict) -> None:
-        session = requests_html.AsyncHTMLSession()
-
-        try:
-            items = await self._get_items(session, params)
-            save_path = os.path.join(params['output'], params['chapter'])
-
-            for item in items:
-                download_url = item['download_url']
-                resp = await session.request(method='GET', url=download_url)
-
-                file_name = download_url.split('/')[-1]
-                async with aiofiles.open(f'{save_path}/{file_name}', "wb") as file:
-                    await file.write(resp.content)
-
-            if self.compress_to_cbr:
-                create_cbr(save_path)
-
-        except asyncio.TimeoutError:
-            raise Exception("Timeout in downloading chapter %s!", params["chapter"])
+def parse_chapter_list(content: str) -> list[str]:
+    # Newest chapter first on the page and the last link is "#top", older chapters first here
+    return CHAPTER_LINK_PATTERN.findall(content)[-2::-1]
 
-        except Exception as e:
-            raise Exception(f"Error on download and save chapter!\n\n{e}")
 
-    async def _download_chapters(self, output: str, chapters_url_list: List[str]) -> None:
-        # session = requests_html.AsyncHTMLSession()
-        coroutines = []
+def parse_new_chapters(content: str, last_url: str) -> list[str] | None:
+    # Stops at the newest chapter already known, it is usually near the top of the page
+    chapters = []
+    for match in CHAPTER_LINK_PATTERN.finditer(content):
+        if match.group(1) == last_url:
+            return chapters[::-1]
+        chapters.append(match.group(1))
+    return None
 
-        last_downloaded = 0
-        last_directory = 0
 
-        for ch in chapters_url_list:
-            chapter = add_leading_zeros(ch['num'], 4)
+def parse_chapter_images(content: str) -> list[str]:
+    return IMAGE_PATTERN.findall(content)
 
-            if not os.path.isdir(os.path.join(output, chapter)):
-                os.mkdir(os.path.join(output, chapter))
 
-            params = {
-                "output": output,
-                "directory": 1,
-                "chapter": chapter,
-                "chapter_url": ch['url']
-            }
-            coroutines.append(self._download_and_save_files(params))
+class WeebCentralService(BaseService):
+    HOST = "https://weebcentral.com"
+    SOURCE = "WeebCentral"
+    CONCURRENCY = 10
+    # CDN nodes the chapter pages point to
+    MIRRORS = ["hot.planeptune.us", "scans.lastation.us", "official.lowee.us"]
 
-            last_downloaded = chapter
-            last_directory = 1
+    def __init__(self):
+        super().__init__()
 
-        # Save the latest one
-        self.manga_repository.update(name=self.manga_name, last_downloaded=last_downloaded, last_directory=last_directory)
-        await chunk_routines(coroutines=coroutines)
+    def _get_manga_url(self) -> str:
+        return f"{self.HOST}/series/{self.manga_name}/full-chapter-list"
 
-    def _get_folder(self, folder: str) -> str:
-        temp_path = folder if folder != "" else get_default_download_folder()
-        return create_folder(os.path.join(temp_path, self.manga_name))
+    def _get_chapter_list_url(self) -> str:
+        return self._get_manga_url()
 
-    def _get_directory(self, directory: int) -> dict:
-        return self._get_manga_dict()["directories"][str(directory)]
+    def _get_manga_chapter_url(self, chapter_url: str) -> str:
+        chapter_code = chapter_url.split("/")[-1]
+        return f"{self.HOST}/chapters/{chapter_code}/images?is_prev=False&current_page=1&reading_style=long_strip"
 
-    def _get_search_details(self) -> List[str]:
+    async def _get_chapter_list(self, ttl: float) -> List[str]:
         url = self._get_manga_url()
-        session = requests_html.HTMLSession()
-        resp = session.get(url)
-        content = resp.content.decode("utf-8")
+        content = await self.http_client.get_text(url, ttl, "chapter_list")
 
-        pattern = re.compile(r'<a href="(.*?)"')
-        chapter_details_search = pattern.findall(content)
+        with self.http_client.metrics.timer("parse", url):
+            chapter_details_search = parse_chapter_list(content)
 
         if chapter_details_search:
-            # remove last "#top" link
-            chapter_details_search.pop()
-            chapter_details_search.reverse()
             return chapter_details_search
         else:
             raise Exception(f"No chapters found at {url}!")
 
-    def search_chapters(self, manga_name: str) -> dict:
-        self.manga_name = manga_name
-
-        if manga_dict := self._get_manga_dict():
-            return manga_dict
-
-        self._set_manga_dict(manga_name)
-        chapters_url_list = self._get_search_details()
-
-        last_directory = "1"
-        for idx, chapter_url in enumerate(chapters_url_list, start=1):
-            try:
-                manga_dict = self._get_manga_dict()
-
-                if manga_dict["directories"].get(last_directory) is None:
-                    manga_dict["directories"][last_directory] = { "chapters": [] }
-
-                manga_dict["directories"][last_directory]["chapters"].append(
-                    {
-                        "num": idx,
-                        "url": chapter_url
-                    }
-                )
-
-                manga_dict["directories"][last_directory]["last_chapter"] = idx
-                manga_dict['chapters_count'] = idx
-            except Exception as e:
-                raise Exception(f"Error on get chapters!\n{e}")
-
-        self.manga_repository.update(name=self.manga_name, available_directories=last_directory)
-        return self._get_manga_dict()
-
-    def get_files(self, params_dic):
-        start_at = 1
-        end_at = 1
-
-        if params_dic["download_option"] == "Range":
-            start_at = params_dic["start_at"]
-            end_at = params_dic["end_at"]
-
-            if start_at > end_at:
-                end_at = start_at
-
-        self.compress_to_cbr = params_dic["cbr"]
-
-        download_folder = self._get_folder(params_dic["output"])
-        target_chapters = []
-
-        directory = self._get_directory(params_dic["directory_option"])
-        last_chapter = directory["last_chapter"]
-
-        if start_at > last_chapter:
-            raise Exception(f"The last chapters for this directory is {last_chapter}!")
-
-        for index in range(start_at-1, end_at):
-            target_chapters.append(directory["chapters"][index])
-
-        asyncio.run(self._download_chapters(download_folder, target_chapters))
+    def _add_chapters(self, manga_dict: dict, chapters_url_list: List[str]) -> int:
+        # Every chapter goes to the same directory, it is built in one pass
+        directory = 1
+        chapters = {
+            idx: {"Chapter": idx, "URL": chapter_url}
+            for idx, chapter_url in enumerate(chapters_url_list, start=1)
+        }
 
+        manga_dict["directories"][directory] = {"chapters": chapters, "last_chapter": len(chapters)}
+        manga_dict["chapters_count"] += len(chapters)
+        return directory
+
+    def _parse_new_chapters(self, content: str, last_url: str) -> List[str] | None:
+        return parse_new_chapters(content, last_url)
+
+    def _add_new_chapters(self, manga_dict: dict, directory: int, chapters_url_list: List[str]) -> None:
+        last_chapter = manga_dict["directories"][directory]["last_chapter"]
+        for idx, chapter_url in enumerate(chapters_url_list, start=last_chapter + 1):
+            self._add_chapter(manga_dict, directory, idx, {"Chapter": idx, "URL": chapter_url})
+
+    def _get_chapter_jobs(self, directory: int, chapter_detail: dict) -> list[dict]:
+        chapter = int(chapter_detail["Chapter"])
+        return [{
+            "number": chapter,
+            "folder": add_leading_zeros(chapter, 4),
+            "directory": directory,
+            "url": chapter_detail["URL"],
+        }]
+
+    async def _get_page_items(self, job: dict, ttl: float) -> list[dict]:
+        url = self._get_manga_chapter_url(job["url"])
+        content = await self.http_client.get_text(url, ttl, "page_html")
+
+        with self.http_client.metrics.timer("parse", url):
+            chapter_pages = parse_chapter_images(content)
+
+        # Named as in their URLs, like the chapters downloaded before, so a repair finds its pages
+        return [
+            {"download_url": download_url, "file_name": download_url.split('/')[-1]}
+            for download_url in chapter_pages
+        ]
@@ -0,0 +1,133 @@
+import asyncio
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+
+# Durability of the pages, from fastest to safest
+FSYNC_NONE = "none"
+FSYNC_CHAPTER = "chapter"
+FSYNC_FILE = "file"
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_CHAPTER, FSYNC_FILE)
+
+
+def sync_path(path: str, directory: bool = False) -> None:
+    # fsync on a directory persists renames and new entries, Windows can't open one
+    if directory and os.name == "nt":
+        return
+
+    fd = os.open(path, os.O_RDONLY if directory else os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriterFile():
+    # Writes run on the pool one after the other, the caller only waits for a
+    # free place in the queue so the next chunk is read while this one is written
+
+    def __init__(self, writer: "DiskWriter", file) -> None:
+        self.writer = writer
+        self.file = file
+        self._pending = None
+
+    async def _write(self, previous: asyncio.Future | None, chunk: bytes) -> None:
+        if previous is not None:
+            await previous
+        await self.writer.run(self.file.write, chunk)
+
+    async def write(self, chunk: bytes) -> None:
+        if self._pending is not None and self._pending.done() and self._pending.exception():
+            raise self._pending.exception()
+
+        await self.writer.slots.acquire()
+        self._pending = asyncio.ensure_future(self._write(self._pending, chunk))
+        # Released even when the write is cancelled before it starts
+        self._pending.add_done_callback(lambda _: self.writer.slots.release())
+
+    def _close(self, sync: bool) -> None:
+        try:
+            if sync:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+        finally:
+            self.file.close()
+
+    async def close(self) -> None:
+        try:
+            if self._pending is not None:
+                await self._pending
+        except BaseException:
+            self._pending.cancel()
+            raise
+        finally:
+            await asyncio.shield(self.writer.run(self._close, self.writer.fsync == FSYNC_FILE))
+
+
+class DiskWriter():
+    WRITER = None
+    WORKERS = 4
+    # Chunks waiting for a thread, reading from the network stops while it is full
+    QUEUE_SIZE = 64
+    FSYNC = FSYNC_NONE
+
+    def __init__(self, workers: int = WORKERS, queue_size: int = QUEUE_SIZE, fsync: str = FSYNC) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise Exception(f"Unknown fsync policy {fsync}!")
+
+        self.fsync = fsync
+        self.queue_size = max(1, queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="disk-writer")
+        self._slots = None
+
+    @staticmethod
+    def _create_writer():
+        DiskWriter.WRITER = DiskWriter(DiskWriter.WORKERS, DiskWriter.QUEUE_SIZE, DiskWriter.FSYNC)
+        return DiskWriter.WRITER
+
+    @staticmethod
+    def get_writer():
+        return DiskWriter.WRITER if DiskWriter.WRITER else DiskWriter._create_writer()
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        # Created on first use, it belongs to the client loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_size)
+        return self._slots
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    @asynccontextmanager
+    async def open(self, path: str, mode: str = "wb"):
+        file = WriterFile(self, await self.run(open, path, mode))
+        try:
+            yield file
+        finally:
+            await file.close()
+
+    def _makedirs(self, folders: list[str]) -> None:
+        for folder in folders:
+            os.makedirs(folder, exist_ok=True)
+
+    async def makedirs(self, folders: list[str]) -> None:
+        # Every folder of a job in a single trip to the pool
+        await self.run(self._makedirs, list(dict.fromkeys(folders)))
+
+    async def replace(self, source: str, target: str) -> None:
+        await self.run(os.replace, source, target)
+
+    def _sync_folder(self, folder: str) -> None:
+        for file_name in os.listdir(folder):
+            file_path = os.path.join(folder, file_name)
+            if os.path.isfile(file_path) and not file_name.endswith(".part"):
+                sync_path(file_path)
+        sync_path(folder, True)
+
+    async def sync_folder(self, folder: str) -> None:
+        # End of a chapter, the "chapter" policy makes its pages durable in one go
+        if self.fsync == FSYNC_CHAPTER:
+            await self.run(self._sync_folder, folder)
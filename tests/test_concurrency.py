@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+from src.services.concurrency import ByteBudget, ConcurrencyController, HostController, Slot, parse_retry_after
+
+
+def get_slot(status: int | None, retry_after: str | None = None) -> Slot:
+    slot = Slot()
+    if status is not None:
+        slot.set_response(status, retry_after)
+    return slot
+
+
+async def finish(controller: HostController, status: int | None, retry_after: str | None = None, failed: bool = False):
+    await controller.acquire()
+    await controller.release(get_slot(status, retry_after), failed)
+
+
+def test_success_increases_the_limit_additively():
+    controller = HostController("host")
+
+    async def run() -> None:
+        for _ in range(4):
+            await finish(controller, 200)
+
+    asyncio.run(run())
+    # About one more slot after a full window of successes
+    assert 4.9 < controller.limit < 5.0
+
+
+def test_limit_stops_at_the_maximum():
+    controller = HostController("host")
+    controller.limit = float(HostController.MAXIMUM)
+    asyncio.run(finish(controller, 200))
+
+    assert controller.limit == HostController.MAXIMUM
+
+
+def test_backoff_halves_the_limit_once_per_round_trip():
+    controller = HostController("host")
+    controller.limit = 16.0
+
+    async def run() -> None:
+        await finish(controller, 503)
+        # Same burst, counted once
+        await finish(controller, 429)
+        await finish(controller, None, failed=True)
+
+    asyncio.run(run())
+    assert controller.limit == 8.0
+
+    controller._last_decrease -= 2.0
+    asyncio.run(finish(controller, None, failed=True))
+    assert controller.limit == 4.0
+
+
+def test_limit_never_drops_below_the_minimum():
+    controller = HostController("host")
+    controller.limit = 1.0
+    asyncio.run(finish(controller, 503))
+
+    assert controller.limit == HostController.MINIMUM
+
+
+def test_acquire_waits_for_a_free_slot():
+    controller = HostController("host")
+    controller.limit = 1.0
+    order = []
+
+    async def run() -> None:
+        await controller.acquire()
+
+        async def second() -> None:
+            await controller.acquire()
+            order.append("second")
+
+        task = asyncio.create_task(second())
+        await asyncio.sleep(0.02)
+        order.append("released")
+        await controller.release(get_slot(500))
+        await task
+
+    asyncio.run(run())
+    assert order == ["released", "second"]
+
+
+def test_retry_after_blocks_the_host():
+    controller = HostController("host")
+
+    async def run() -> float:
+        await finish(controller, 429, "0.2")
+        started_at = time.monotonic()
+        await controller.acquire()
+        return time.monotonic() - started_at
+
+    assert asyncio.run(run()) >= 0.15
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) == 0
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-3") == 0
+    assert parse_retry_after("soon") == 0
+    assert parse_retry_after("Thu, 01 Jan 1970 00:00:00 GMT") == 0
+
+
+def test_controllers_are_per_host():
+    controller = ConcurrencyController()
+
+    assert controller.get("http://a/1") is controller.get("http://a/2")
+    assert controller.get("http://a/1") is not controller.get("http://b/1")
+
+
+def test_budget_never_grows_ahead_of_a_waiting_reader():
+    budget = ByteBudget(100)
+
+    async def run() -> None:
+        await budget.acquire(80)
+        waiting = asyncio.create_task(budget.acquire(50))
+        await asyncio.sleep(0.01)
+
+        assert not budget.try_acquire(10)
+        await budget.release(80)
+        assert await waiting == 50
+        assert budget.try_acquire(10)
+
+    asyncio.run(run())
+    assert budget.in_flight == 60
+    assert budget.peak == 80
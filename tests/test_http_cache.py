@@ -0,0 +1,119 @@
+import os
+import time
+
+import pytest
+
+from aiohttp import web
+
+from src.services import http_cache
+from src.services.http_cache import HttpCache
+from src.services.http_client import HttpClient
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HttpCache(str(tmp_path / "cache"))
+
+
+class Clock():
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def client(cache):
+    client = HttpClient()
+    client._cache = cache
+    yield client
+    client.shutdown()
+
+
+def set_used_at(cache: HttpCache, url: str, used_at: float) -> None:
+    meta_path, _ = cache._get_paths(url)
+    os.utime(meta_path, (used_at, used_at))
+
+
+def test_entry_is_fresh_within_ttl(cache, clock):
+    cache.store("http://host/list", b"chapters", None, None)
+    entry = cache.get("http://host/list")
+    assert entry["body"] == b"chapters"
+
+    clock.now += 30
+    assert cache.is_fresh(entry, 60)
+
+    clock.now += 60
+    assert not cache.is_fresh(entry, 60)
+
+
+def test_touch_starts_the_ttl_again(cache, clock):
+    cache.store("http://host/list", b"chapters", "v1", None)
+    clock.now += 120
+    assert not cache.is_fresh(cache.get("http://host/list"), 60)
+
+    cache.touch("http://host/list")
+    assert cache.is_fresh(cache.get("http://host/list"), 60)
+
+
+def test_missing_entry(cache):
+    assert cache.get("http://host/unknown") is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache"), max_size=2500)
+    now = time.time()
+    cache.store("http://host/a", b"a" * 1000, None, None)
+    cache.store("http://host/b", b"b" * 1000, None, None)
+    set_used_at(cache, "http://host/a", now - 20)
+    set_used_at(cache, "http://host/b", now - 30)
+
+    # Reading "b" makes "a" the least recently used one
+    cache.get("http://host/b")
+    cache._size = None
+    cache.store("http://host/c", b"c" * 1000, None, None)
+
+    assert cache.get("http://host/a") is None
+    assert cache.get("http://host/b")["body"] == b"b" * 1000
+    assert cache.get("http://host/c")["body"] == b"c" * 1000
+
+
+def test_not_modified_reuses_the_stored_body(client):
+    requests = []
+
+    async def handler(request: web.Request) -> web.Response:
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(body=b"chapter list", headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/list", handler)
+    runner = web.AppRunner(app)
+
+    async def start() -> str:
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        return f"http://{host}:{port}/list"
+
+    url = client.run(start())
+    try:
+        assert client.run(client.get_cached(url, 0)) == b"chapter list"
+        assert client.run(client.get_cached(url, 0)) == b"chapter list"
+        # Fresh, no request at all
+        assert client.run(client.get_cached(url, 60)) == b"chapter list"
+    finally:
+        client.run(runner.cleanup())
+
+    assert requests == [None, '"v1"']
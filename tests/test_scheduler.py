@@ -0,0 +1,101 @@
+import asyncio
+import inspect
+
+import pytest
+
+from src.services.scheduler import Scheduler
+
+
+class Tracker():
+    # Counts the coroutines running at once
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.peak = 0
+        self.started = []
+
+    async def work(self, index: int, seconds: float = 0.01) -> int:
+        self.started.append(index)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.active -= 1
+        return index
+
+
+def test_keeps_the_limit_in_flight():
+    tracker = Tracker()
+    results = asyncio.run(Scheduler(3).run([tracker.work(index) for index in range(20)]))
+
+    assert results == list(range(20))
+    assert tracker.peak == 3
+
+
+def test_pages_share_the_given_slots():
+    tracker = Tracker()
+
+    async def run() -> None:
+        slots = asyncio.Semaphore(4)
+        schedulers = [Scheduler(page_limit=8, page_slots=slots) for _ in range(2)]
+        await asyncio.gather(*[
+            scheduler.run_pages([tracker.work(index) for index in range(10)])
+            for scheduler in schedulers
+        ])
+
+    asyncio.run(run())
+    assert tracker.peak == 4
+
+
+def test_failure_stops_the_other_coroutines():
+    tracker = Tracker()
+
+    async def fail() -> None:
+        await asyncio.sleep(0.005)
+        raise ValueError("page failed")
+
+    coroutines = [fail(), *[tracker.work(index, 1.0) for index in range(10)]]
+
+    with pytest.raises(ValueError):
+        asyncio.run(Scheduler(3).run(coroutines))
+
+    assert tracker.active == 0
+    # The ones that never started are closed, not left unawaited
+    assert all(inspect.getcoroutinestate(coroutine) == inspect.CORO_CLOSED for coroutine in coroutines)
+
+
+def test_cancellation_reaches_every_coroutine():
+    tracker = Tracker()
+    coroutines = [tracker.work(index, 1.0) for index in range(10)]
+
+    async def run() -> None:
+        task = asyncio.create_task(Scheduler(4).run(coroutines))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert len(tracker.started) == 4
+    assert tracker.active == 0
+    assert all(inspect.getcoroutinestate(coroutine) == inspect.CORO_CLOSED for coroutine in coroutines)
+
+
+def test_coroutines_waiting_for_a_slot_are_closed_on_cancel():
+    coroutines = [asyncio.sleep(1.0) for _ in range(6)]
+
+    async def run() -> None:
+        slots = asyncio.Semaphore(1)
+        task = asyncio.create_task(Scheduler(page_limit=6, page_slots=slots).run_pages(coroutines))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert all(inspect.getcoroutinestate(coroutine) == inspect.CORO_CLOSED for coroutine in coroutines)
+
+
+def test_empty_run():
+    assert asyncio.run(Scheduler().run([])) == []
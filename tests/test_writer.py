@@ -0,0 +1,120 @@
+import asyncio
+import os
+
+import pytest
+
+from src.services import writer as writer_module
+from src.services.writer import DiskWriter, WriterFile, FSYNC_CHAPTER
+
+
+class FailingFile():
+    # Fails on its second write, like a disk that fills up
+
+    def __init__(self) -> None:
+        self.writes = 0
+        self.closed = False
+
+    def write(self, chunk: bytes) -> int:
+        self.writes += 1
+        if self.writes == 2:
+            raise OSError("No space left on device")
+        return len(chunk)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_chunks_are_written_in_order(tmp_path):
+    writer = DiskWriter(workers=4, queue_size=2)
+    path = str(tmp_path / "page.png")
+    chunks = [bytes([index]) * (1000 + index) for index in range(100)]
+
+    async def run() -> None:
+        async with writer.open(path) as file:
+            for chunk in chunks:
+                await file.write(chunk)
+
+    asyncio.run(run())
+    with open(path, "rb") as file:
+        assert file.read() == b"".join(chunks)
+
+
+def test_append_mode_keeps_the_existing_bytes(tmp_path):
+    writer = DiskWriter()
+    path = str(tmp_path / "page.png.part")
+    with open(path, "wb") as file:
+        file.write(b"first")
+
+    async def run() -> None:
+        async with writer.open(path, "ab") as file:
+            await file.write(b"second")
+
+    asyncio.run(run())
+    with open(path, "rb") as file:
+        assert file.read() == b"firstsecond"
+
+
+def test_write_error_reaches_the_caller():
+    writer = DiskWriter(queue_size=4)
+    failing = FailingFile()
+
+    async def run() -> None:
+        file = WriterFile(writer, failing)
+        try:
+            for _ in range(10):
+                await file.write(b"chunk")
+                await asyncio.sleep(0.01)
+        finally:
+            await file.close()
+
+    with pytest.raises(OSError, match="No space left"):
+        asyncio.run(run())
+
+    # Nothing is written after the failure and the file is closed anyway
+    assert failing.writes == 2
+    assert failing.closed
+
+
+def test_write_error_is_raised_on_close():
+    writer = DiskWriter(queue_size=4)
+    failing = FailingFile()
+
+    async def run() -> None:
+        file = WriterFile(writer, failing)
+        await file.write(b"chunk")
+        await file.write(b"chunk")
+        await file.close()
+
+    with pytest.raises(OSError, match="No space left"):
+        asyncio.run(run())
+    assert failing.closed
+
+
+def test_queue_slots_are_given_back():
+    writer = DiskWriter(queue_size=2)
+
+    async def run() -> None:
+        file = WriterFile(writer, FailingFile())
+        with pytest.raises(OSError):
+            await file.write(b"chunk")
+            await file.write(b"chunk")
+            await file.close()
+        return writer.slots._value
+
+    assert asyncio.run(run()) == 2
+
+
+def test_sync_folder_skips_partial_files(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(writer_module, "sync_path", lambda path, directory=False: synced.append(os.path.basename(path)))
+    writer = DiskWriter(fsync=FSYNC_CHAPTER)
+    for name in ("001.png", "002.png.part"):
+        (tmp_path / name).write_bytes(b"page")
+
+    asyncio.run(writer.sync_folder(str(tmp_path)))
+    assert synced == ["001.png", tmp_path.name]
+
+
+def test_unknown_fsync_policy():
+    with pytest.raises(Exception, match="Unknown fsync policy"):
+        DiskWriter(fsync="always")